@@ -0,0 +1,187 @@
+import os
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import platform
+import subprocess
+import importlib.util
+
+# Benchmark das etapas do processamento com corpora sintéticos em português (1k, 100k e 1M linhas), de dois tipos:
+# 'zipf' (poucas palavras muito frequentes) e 'cauda_longa' (hashtags, menções e erros de digitação quase sempre novos).
+# Roda sem internet: usa o pt_core_news_sm já instalado e nunca tenta baixá-lo.
+# Uso: python Tass_benchmark.py --saida benchmark.json [--tamanhos 1000 100000] [--etapas clean_text_2 download_txt]
+#      [--corpora cauda_longa]
+# Os arquivos JSON de execuções diferentes podem ser comparados para achar regressões.
+
+MODELO = 'pt_core_news_sm'
+TAMANHOS = [1000, 100000, 1000000]
+CORPORA = ['zipf', 'cauda_longa']
+ETAPAS = ['base64_decode', 'clean_text', 'clean_text_2', 'dev_clean_text', 'dev_limpar_coluna',
+          'corpus_codificado', 'wordcloud_jpeg', 'filtro_lista', 'download_txt']
+
+# Vocabulário do corpus sintético: substantivos, adjetivos e verbos comuns, stopwords, gírias de redes sociais
+# e pontuação, para exercitar a lematização, a remoção de stopwords e a normalização da Tokenização
+substantivos = ['casa', 'casas', 'gato', 'gatos', 'cidade', 'cidades', 'governo', 'escola', 'escolas', 'saúde', 'educação',
+                'trabalho', 'empresa', 'empresas', 'cliente', 'clientes', 'produto', 'produtos', 'serviço', 'serviços',
+                'dinheiro', 'tempo', 'dia', 'dias', 'ano', 'anos', 'pessoa', 'pessoas', 'problema', 'problemas',
+                'atendimento', 'entrega', 'preço', 'preços', 'qualidade', 'internet', 'celular', 'ônibus', 'rua', 'ruas',
+                'criança', 'crianças', 'família', 'política', 'eleição', 'vacina', 'hospital', 'médico', 'médicos', 'água']
+adjetivos = ['bom', 'boa', 'bons', 'boas', 'ruim', 'ruins', 'ótimo', 'ótima', 'péssimo', 'péssima', 'novo', 'nova', 'novos',
+             'grande', 'grandes', 'pequeno', 'pequena', 'caro', 'cara', 'barato', 'rápido', 'rápida', 'lento', 'difícil',
+             'fácil', 'público', 'pública', 'importante', 'feliz', 'triste', 'bonito', 'bonita', 'horrível', 'excelente']
+verbos = ['é', 'foi', 'está', 'estava', 'tem', 'tinha', 'fazer', 'faz', 'fiz', 'comprei', 'comprar', 'chegou', 'chegar',
+          'gostei', 'gosto', 'recomendo', 'precisa', 'precisamos', 'quero', 'queria', 'vai', 'vou', 'ficou', 'ficar',
+          'demorou', 'funciona', 'funcionou', 'pagar', 'paguei', 'falar', 'disse', 'acho', 'achei', 'ver', 'vi']
+stopwords = ['a', 'o', 'as', 'os', 'de', 'da', 'do', 'das', 'dos', 'e', 'em', 'na', 'no', 'um', 'uma', 'para', 'pra',
+             'com', 'que', 'não', 'mas', 'muito', 'mais', 'se', 'por', 'eu', 'você', 'vc', 'q', 'né', 'tá', 'rt']
+extras = ['kkkk', 'rsrs', 'aff', '#brasil', '@usuario', 'https://t.co/abc123', '😀', '100%', 'R$50', '2024']
+pontuacao = ['', '', '', '', ',', '.', '!', '?', '...', ':', ';', '…', '”']
+
+def gerar_linhas(quantidade, semente=42):
+    aleatorio = random.Random(semente)
+    palavras = substantivos + adjetivos + verbos + stopwords + extras
+    # Distribuição parecida com a de textos reais (lei de Zipf): poucas palavras muito frequentes
+    pesos = [1 / (posicao + 1) for posicao in range(len(palavras))]
+    aleatorio.shuffle(pesos)
+    linhas = []
+    for _ in range(quantidade):
+        tamanho = aleatorio.randint(4, 30)
+        termos = aleatorio.choices(palavras, weights=pesos, k=tamanho)
+        texto = ' '.join(termo + aleatorio.choice(pontuacao) for termo in termos)
+        linhas.append(texto[0].upper() + texto[1:] if aleatorio.random() < 0.5 else texto)
+    return linhas
+
+# Textos de redes sociais em que quase todo termo é raro: hashtags, menções, palavras com letras repetidas ou
+# trocadas e números colados, misturados a algumas palavras comuns
+def gerar_linhas_cauda_longa(quantidade, semente=42):
+    aleatorio = random.Random(semente)
+    letras = 'abcdefghijklmnopqrstuvwxyzáéíóúãõç'
+    comuns = substantivos + adjetivos + verbos + stopwords
+    linhas = []
+    for _ in range(quantidade):
+        termos = []
+        for _ in range(aleatorio.randint(4, 20)):
+            if aleatorio.random() < 0.3:
+                termos.append(aleatorio.choice(comuns))
+                continue
+            termo = ''.join(aleatorio.choice(letras) for _ in range(aleatorio.randint(3, 12)))
+            termos.append(aleatorio.choice(['#', '@', '', '']) + termo + aleatorio.choice(['', '', str(aleatorio.randint(0, 999))])
+                          + aleatorio.choice(pontuacao))
+        linhas.append(' '.join(termos))
+    return linhas
+
+GERADORES = {'zipf': gerar_linhas, 'cauda_longa': gerar_linhas_cauda_longa}
+
+def versao_codigo():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+# Mede a função várias vezes e guarda o menor tempo (o menos afetado por ruído da máquina)
+def medir(funcao, repeticoes, antes=None):
+    tempos = []
+    resultado = None
+    for _ in range(repeticoes):
+        if antes is not None:
+            antes()
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), tempos, resultado
+
+def executar(tamanhos, etapas, repeticoes, corpora=CORPORA):
+    import Tass_nlp
+    from Tass_corpus import CorpusCodificado
+    from Tass_nuvem import renderizar_nuvem
+    from Tass_downloads import blocos_linhas
+    dev = None
+    if 'dev_clean_text' in etapas or 'dev_limpar_coluna' in etapas:
+        import pandas as pd
+        import Tass_textanalyzer_dev as dev
+
+    # O modelo é carregado e aquecido antes das medições, para a carga não entrar no tempo da primeira etapa
+    Tass_nlp.obter_modelo()
+    lista = ' '.join(substantivos[::3] + adjetivos[::3])
+    resultados = []
+    for tipo in corpora:
+        linhas_todas = GERADORES[tipo](max(tamanhos))
+        for tamanho in sorted(tamanhos):
+            linhas = linhas_todas[:tamanho]
+            texto = '\n'.join(linhas)
+            tamanho_bytes = len(texto.encode('utf-8'))
+            print(f'{tipo}: {tamanho} linhas ({tamanho_bytes / 1e6:.1f} MB)', file=sys.stderr)
+            medidas = {}
+
+            def registrar(nome, funcao, antes=None):
+                if nome not in etapas:
+                    return None
+                segundos, tempos, resultado = medir(funcao, repeticoes, antes)
+                medidas[nome] = {'segundos': segundos, 'tempos': tempos,
+                                 'linhas_por_segundo': tamanho / segundos if segundos else None,
+                                 'mb_por_segundo': tamanho_bytes / 1e6 / segundos if segundos else None}
+                print(f'  {nome}: {segundos:.3f}s', file=sys.stderr)
+                return resultado
+
+            # Conteúdo no formato entregue pelo dcc.Upload (data URI em base64)
+            conteudo = 'data:text/plain;base64,' + base64.b64encode(texto.encode('utf-8')).decode()
+            registrar('base64_decode', lambda: base64.b64decode(conteudo.split(',')[1]).decode('utf-8').splitlines())
+
+            # O cache de lemas é esvaziado antes de cada repetição para medir sempre o mesmo trabalho. A Tokenização
+            # não guarda nada entre chamadas (cada tokenizar_linhas começa com um Tokenizador novo).
+            registrar('clean_text', lambda: Tass_nlp.lematizar_linhas(linhas)[0], antes=Tass_nlp.cache_lemas.limpar)
+            tokens = registrar('clean_text_2', lambda: list(Tass_nlp.tokenizar_linhas(linhas)))
+            if dev is not None:
+                registrar('dev_clean_text', lambda: [', '.join(dev.clean_text(linha)) for linha in linhas])
+                serie = pd.Series(linhas)
+                registrar('dev_limpar_coluna', lambda: dev.limpar_coluna(serie))
+
+            if tokens is None:
+                tokens = list(Tass_nlp.tokenizar_linhas(linhas))
+            corpus = registrar('corpus_codificado', lambda: CorpusCodificado.de_linhas(tokens))
+            if corpus is None:
+                corpus = CorpusCodificado.de_linhas(tokens)
+            registrar('wordcloud_jpeg', lambda: renderizar_nuvem(corpus.frequencias()))
+            registrar('filtro_lista', lambda: corpus.filtrar(lista.split()))
+            # Mesmo gerador de blocos usado pela rota de download do TXT
+            registrar('download_txt', lambda: sum(len(bloco) for bloco in blocos_linhas(corpus)))
+
+            resultados.append({'corpus': tipo, 'linhas': tamanho, 'bytes': tamanho_bytes, 'etapas': medidas})
+    return resultados
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark das etapas do TASS Text Analyzer')
+    parser.add_argument('--saida', default='benchmark.json', help='arquivo JSON com os resultados')
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS, help='quantidades de linhas dos corpora')
+    parser.add_argument('--etapas', nargs='+', default=ETAPAS, choices=ETAPAS, help='etapas a medir')
+    parser.add_argument('--corpora', nargs='+', default=CORPORA, choices=CORPORA, help='tipos de corpus sintético')
+    parser.add_argument('--repeticoes', type=int, default=1, help='repetições de cada etapa (vale o menor tempo)')
+    args = parser.parse_args()
+
+    # Sem internet o modelo não pode ser baixado: falhar logo, antes de qualquer medição
+    if importlib.util.find_spec(MODELO) is None:
+        sys.exit(f'O modelo {MODELO} não está instalado (python -m spacy download {MODELO}).')
+
+    inicio = time.time()
+    resultados = executar(args.tamanhos, args.etapas, args.repeticoes, args.corpora)
+
+    import spacy
+    relatorio = {'data': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(inicio)),
+                 'commit': versao_codigo(),
+                 'python': platform.python_version(),
+                 'plataforma': platform.platform(),
+                 'processadores': os.cpu_count(),
+                 'spacy': spacy.__version__,
+                 'modelo': MODELO,
+                 'repeticoes': args.repeticoes,
+                 'resultados': resultados}
+    with open(args.saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+    print(f'Resultados gravados em {args.saida}', file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
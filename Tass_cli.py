@@ -0,0 +1,173 @@
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import concurrent.futures
+
+# Modo de linha de comando, sem a interface Dash: processa arquivos TXT, CSV e XLSX com o mesmo
+# processamento do aplicativo (clean_text = Lematização, clean_text_2 = Tokenização), em paralelo entre os núcleos.
+# Para cada arquivo são gravados os tokens (uma linha por linha de entrada), a tabela de frequências
+# e, opcionalmente, a nuvem de palavras. Arquivos já concluídos ficam registrados em progresso.json
+# e são pulados numa nova execução (a menos que tenham mudado).
+# Uso: python Tass_cli.py "dados/*.txt" "planilhas/*.xlsx" --saida resultados --modo clean_text --nuvem
+
+ARQUIVO_PROGRESSO = 'progresso.json'
+EXTENSOES = ('.txt', '.csv', '.xlsx')
+
+# Linhas de texto do arquivo: TXT linha a linha (sem as vazias, como no aplicativo) ou a coluna de texto do CSV/XLSX
+def ler_textos(caminho, coluna):
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao == '.txt':
+        with open(caminho, encoding='utf-8') as arquivo:
+            for linha in arquivo:
+                if linha.strip():
+                    yield linha.strip()
+        return
+
+    # Só a coluna de texto, lida em lotes (ver Tass_planilhas)
+    from Tass_planilhas import ler_lotes
+    for lote in ler_lotes(caminho, extensao, coluna):
+        for texto in lote.fillna('').astype(str):
+            yield ' '.join(texto.split())  # uma linha de saída por linha da tabela
+
+# Executado em um processo do pool: o SpaCy só é importado aqui, nunca no processo principal
+def processar_arquivo(caminho, destino, modo, coluna, nuvem, formato_nuvem, limite_termos=None):
+    from Tass_nlp import iterar_lematizacao, tokenizar_linhas, LinhasRepetidas
+    from Tass_frequencias import contar_frequencias, ContagemAproximada
+
+    inicio = time.perf_counter()
+    textos = ler_textos(caminho, coluna)
+    repetidas = LinhasRepetidas()
+    if modo == 'clean_text':
+        resultados = iterar_lematizacao(textos, n_process=1, repetidas=repetidas)
+    else:
+        resultados = (' '.join(palavras) for palavras in tokenizar_linhas(textos))
+
+    # Os arquivos são gravados com um nome temporário e renomeados no fim, para que uma execução
+    # interrompida nunca deixe resultados pela metade com cara de prontos
+    caminho_tokens = destino + '.tokens.txt'
+    linhas = 0
+    frequencias = None
+    with open(caminho_tokens + '.tmp', 'w', encoding='utf-8') as arquivo:
+        def gravar(resultados):
+            nonlocal linhas
+            for resultado in resultados:
+                arquivo.write(resultado + '\n')
+                linhas += 1
+                yield resultado
+        frequencias = contar_frequencias(gravar(resultados), limite_termos)
+    os.replace(caminho_tokens + '.tmp', caminho_tokens)
+
+    # Na contagem aproximada, a frequência gravada é o mínimo garantido e erro_maximo o quanto a real pode passar dele
+    erro_maximo = getattr(frequencias, 'erro_maximo', None)
+    caminho_frequencias = destino + '.frequencias.csv'
+    with open(caminho_frequencias + '.tmp', 'w', encoding='utf-8') as arquivo:
+        arquivo.write('termo;frequencia\n' if erro_maximo is None else 'termo;frequencia;erro_maximo\n')
+        for termo, contagem in frequencias.most_common():
+            arquivo.write(f'{termo};{contagem}\n' if erro_maximo is None else f'{termo};{contagem};{erro_maximo}\n')
+    os.replace(caminho_frequencias + '.tmp', caminho_frequencias)
+
+    if nuvem and frequencias:
+        from Tass_nuvem import renderizar_nuvem
+        caminho_nuvem = destino + '.nuvem.' + formato_nuvem.lower()
+        with open(caminho_nuvem + '.tmp', 'wb') as arquivo:
+            arquivo.write(renderizar_nuvem(frequencias, formato_nuvem))
+        os.replace(caminho_nuvem + '.tmp', caminho_nuvem)
+
+    # Counter também tem um método total(): o tipo é verificado para que o progresso receba sempre um número
+    tokens = frequencias.total if isinstance(frequencias, ContagemAproximada) else sum(frequencias.values())
+    return {'linhas': linhas, 'termos': len(frequencias), 'tokens': tokens,
+            'erro_maximo': erro_maximo, 'repetidas': repetidas.repetidas, 'segundos': time.perf_counter() - inicio}
+
+def expandir_entradas(padroes):
+    caminhos = []
+    for padrao in padroes:
+        encontrados = sorted(glob.glob(padrao, recursive=True)) or ([padrao] if os.path.isfile(padrao) else [])
+        if not encontrados:
+            print(f'Nenhum arquivo encontrado para {padrao}', file=sys.stderr)
+        for caminho in encontrados:
+            caminho = os.path.abspath(caminho)
+            if caminho.lower().endswith(EXTENSOES) and caminho not in caminhos:
+                caminhos.append(caminho)
+    return caminhos
+
+# Nome dos arquivos de saída: o nome do arquivo de entrada, com um sufixo quando dois arquivos têm o mesmo nome
+def nomes_saida(caminhos):
+    bases = [os.path.splitext(os.path.basename(caminho))[0] for caminho in caminhos]
+    repetidos = {base for base in bases if bases.count(base) > 1}
+    return {caminho: base + '-' + hashlib.sha1(caminho.encode('utf-8')).hexdigest()[:8] if base in repetidos else base
+            for caminho, base in zip(caminhos, bases)}
+
+# Identifica a versão do arquivo de entrada e as opções usadas: se algo mudar, o arquivo é processado de novo
+def assinatura(caminho, args):
+    estado = os.stat(caminho)
+    return {'tamanho': estado.st_size, 'modificado': estado.st_mtime_ns, 'modo': args.modo,
+            'coluna': args.coluna, 'nuvem': args.nuvem and args.formato_nuvem, 'limite_termos': args.limite_termos}
+
+def carregar_progresso(caminho):
+    try:
+        with open(caminho, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return {}
+
+def salvar_progresso(caminho, progresso):
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as arquivo:
+        json.dump(progresso, arquivo, ensure_ascii=False, indent=2)
+    os.replace(caminho + '.tmp', caminho)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Processamento em lote do TASS Text Analyzer, sem a interface web')
+    parser.add_argument('entradas', nargs='+', help='arquivos ou padrões glob (TXT, CSV ou XLSX; use ** para subpastas)')
+    parser.add_argument('--saida', default='resultados', help='pasta dos arquivos gerados')
+    parser.add_argument('--modo', choices=['clean_text', 'clean_text_2'], default='clean_text',
+                        help='clean_text = Lematização, clean_text_2 = Tokenização')
+    parser.add_argument('--coluna', default='text', help='coluna de texto dos arquivos CSV/XLSX')
+    parser.add_argument('--processos', type=int, default=os.cpu_count() or 1, help='arquivos processados ao mesmo tempo')
+    parser.add_argument('--nuvem', action='store_true', help='gravar também a nuvem de palavras de cada arquivo')
+    parser.add_argument('--formato-nuvem', default='PNG', choices=['PNG', 'JPEG', 'WEBP'])
+    parser.add_argument('--limite-termos', type=int, default=None,
+                        help='contagem aproximada com memória fixa: guarda no máximo 2x esse número de termos '
+                             '(frequências com erro máximo informado, ver Tass_frequencias.ContagemAproximada)')
+    parser.add_argument('--reiniciar', action='store_true', help='ignorar o progresso salvo e processar tudo de novo')
+    args = parser.parse_args(argv)
+
+    caminhos = expandir_entradas(args.entradas)
+    if not caminhos:
+        return 1
+    os.makedirs(args.saida, exist_ok=True)
+    caminho_progresso = os.path.join(args.saida, ARQUIVO_PROGRESSO)
+    progresso = {} if args.reiniciar else carregar_progresso(caminho_progresso)
+    nomes = nomes_saida(caminhos)
+
+    pendentes = [caminho for caminho in caminhos
+                 if progresso.get(caminho, {}).get('assinatura') != assinatura(caminho, args)]
+    print(f'{len(caminhos)} arquivos, {len(caminhos) - len(pendentes)} já processados', file=sys.stderr)
+
+    falhas = 0
+    processos = max(1, min(args.processos, len(pendentes)))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processos) as executor:
+        futuros = {executor.submit(processar_arquivo, caminho, os.path.join(args.saida, nomes[caminho]), args.modo,
+                                   args.coluna, args.nuvem, args.formato_nuvem, args.limite_termos): caminho
+                   for caminho in pendentes}
+        for concluidos, futuro in enumerate(concurrent.futures.as_completed(futuros), 1):
+            caminho = futuros[futuro]
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                falhas += 1
+                print(f'[{concluidos}/{len(pendentes)}] {caminho}: erro: {e}', file=sys.stderr)
+                continue
+            progresso[caminho] = {'assinatura': assinatura(caminho, args), 'saida': nomes[caminho], **resultado}
+            salvar_progresso(caminho_progresso, progresso)
+            aproximado = f", erro máximo {resultado['erro_maximo']}" if resultado['erro_maximo'] is not None else ''
+            print(f"[{concluidos}/{len(pendentes)}] {caminho}: {resultado['linhas']} linhas, "
+                  f"{resultado['termos']} termos{aproximado} ({resultado['repetidas']} linhas repetidas) "
+                  f"em {resultado['segundos']:.1f}s", file=sys.stderr)
+    return 1 if falhas else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
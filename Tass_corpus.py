@@ -0,0 +1,220 @@
+import sys
+from array import array
+from collections import Counter
+import numpy as np
+
+LINHAS_BLOCO_NGRAMAS = 100000  # linhas lidas de uma vez na contagem de n-gramas
+
+# Índices dos n maiores valores, na ordem original; empates no corte ficam com os que vêm primeiro
+def maiores(valores, n):
+    if len(valores) <= n:
+        return np.arange(len(valores))
+    corte = np.partition(valores, len(valores) - n)[len(valores) - n]
+    acima = np.flatnonzero(valores > corte)
+    empatados = np.flatnonzero(valores == corte)[:n - len(acima)]
+    return np.sort(np.concatenate((acima, empatados)))
+
+# Ids dos termos de uma linha, acrescentando ao vocabulário (lista id -> termo e dicionário termo -> id) os termos
+# novos. Os termos já conhecidos são convertidos em bloco com map; só os novos passam pelo laço.
+# Compartilhado por CorpusCodificado e pelo GravadorCorpus (Tass_corpus_disco).
+def codificar_termos(termos, vocabulario, ids_termos):
+    ids_linha = list(map(ids_termos.get, termos))
+    if None in ids_linha:
+        for i, termo in enumerate(termos):
+            if ids_linha[i] is None:
+                ids_linha[i] = novo_termo(termo, vocabulario, ids_termos)
+    return ids_linha
+
+def novo_termo(termo, vocabulario, ids_termos):
+    termo_id = ids_termos.get(termo)
+    if termo_id is None:
+        termo_id = len(vocabulario)
+        ids_termos[termo] = termo_id
+        vocabulario.append(sys.intern(termo))
+    return termo_id
+
+# Corpus processado em formato compacto: cada palavra distinta é guardada uma única vez no vocabulário
+# e o texto vira uma sequência de ids inteiros (array 'I'), com o início de cada linha em 'offsets'.
+# Contagem, filtragem e exportação trabalham direto sobre os ids.
+class CorpusCodificado:
+    def __init__(self):
+        self.vocabulario = []  # id -> termo
+        self.ids_termos = {}  # termo -> id
+        self.ids = array('I')
+        self.offsets = array('Q', [0])
+        self._contagens = None
+        self._ngramas = {}  # n -> (códigos, contagens), ver contagens_ngramas
+
+    @classmethod
+    def de_linhas(cls, linhas):
+        corpus = cls()
+        for linha in linhas:
+            corpus.append(linha)
+        return corpus
+
+    # Monta o corpus direto dos ids já calculados (ex.: pd.factorize), sem passar linha a linha
+    @classmethod
+    def de_ids(cls, vocabulario, ids, offsets):
+        return cls().estender_ids(vocabulario, ids, offsets)
+
+    # Acrescenta linhas já codificadas com um vocabulário próprio (ex.: o pd.factorize de um lote do arquivo):
+    # os ids locais são convertidos para os ids deste corpus com uma única indexação do NumPy
+    def estender_ids(self, vocabulario, ids, offsets):
+        mapa = np.array([self._novo_termo(str(termo)) for termo in vocabulario], dtype=np.uintc)
+        self.ids.frombytes(mapa[np.asarray(ids, dtype=np.intp)].tobytes())
+        base = self.offsets[-1]
+        self.offsets.frombytes((np.asarray(offsets[1:], dtype=np.uint64) + np.uint64(base)).tobytes())
+        self._contagens = None
+        self._ngramas = {}
+        return self
+
+    # Acrescenta uma linha já processada (tokens separados por espaço ou lista de tokens)
+    def append(self, linha):
+        termos = linha.split() if isinstance(linha, str) else linha
+        self.ids.extend(codificar_termos(termos, self.vocabulario, self.ids_termos))
+        self.offsets.append(len(self.ids))
+        self._contagens = None
+        self._ngramas = {}
+
+    def _novo_termo(self, termo):
+        return novo_termo(termo, self.vocabulario, self.ids_termos)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return [self.linha(i) for i in range(*indice.indices(len(self)))]
+        if indice < 0:
+            indice += len(self)
+        if not 0 <= indice < len(self):
+            raise IndexError(indice)
+        return self.linha(indice)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.linha(i)
+
+    def ids_linha(self, i):
+        return self.ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def linha(self, i):
+        vocabulario = self.vocabulario
+        return ' '.join(vocabulario[termo_id] for termo_id in self.ids_linha(i))
+
+    # Linhas inicio:fim com os termos unidos por separador, decodificadas com uma leitura contígua dos ids
+    # (ex.: a coluna tokens dos apps de CSV e XLSX, refeita bloco a bloco no download)
+    def linhas_unidas(self, inicio, fim, separador=' '):
+        offsets = list(self.offsets[inicio:fim + 1])
+        if not offsets:
+            return []
+        vocabulario = self.vocabulario
+        termos = [vocabulario[termo_id] for termo_id in self.ids[offsets[0]:offsets[-1]]]
+        base = offsets[0]
+        return [separador.join(termos[a - base:b - base]) for a, b in zip(offsets, offsets[1:])]
+
+    @property
+    def total_tokens(self):
+        return len(self.ids)
+
+    # Espaço ocupado pelo corpus (usado na contabilidade de memória das sessões)
+    @property
+    def nbytes(self):
+        return (self.ids.itemsize * len(self.ids) + self.offsets.itemsize * len(self.offsets)
+                + sys.getsizeof(self.vocabulario) + sys.getsizeof(self.ids_termos)
+                + sum(sys.getsizeof(termo) for termo in self.vocabulario))
+
+    # Frequência de cada id do vocabulário, calculada uma vez com np.bincount
+    def contagens(self):
+        if self._contagens is None:
+            self._contagens = np.bincount(np.frombuffer(self.ids, dtype=np.uintc), minlength=len(self.vocabulario))
+        return self._contagens
+
+    # Índice termo -> frequência de todo o corpus
+    def frequencias(self):
+        contagens = self.contagens()
+        return Counter({termo: int(contagens[termo_id]) for termo_id, termo in enumerate(self.vocabulario)})
+
+    # Só os n termos mais frequentes (o que a nuvem de palavras usa), sem montar o índice do vocabulário inteiro.
+    # Os empates no corte ficam com os termos que apareceram primeiro, como na ordenação estável do WordCloud.
+    def mais_frequentes(self, n):
+        contagens = self.contagens()
+        return Counter({self.vocabulario[termo_id]: int(contagens[termo_id]) for termo_id in maiores(contagens, n).tolist()})
+
+    # Contagem dos n-gramas (n termos seguidos na mesma linha) direto sobre os ids, sem reler o texto: a janela
+    # de n ids vira um único inteiro (ids combinados na base len(vocabulario)) e np.unique conta os códigos.
+    # Os ids são percorridos em blocos de linhas, para o corpus em disco não ser copiado inteiro para a memória.
+    # O resultado fica guardado no corpus: a nuvem e a lista de n-gramas não refazem a contagem.
+    def contagens_ngramas(self, n=2):
+        if n in self._ngramas:
+            return self._ngramas[n]
+        base = max(len(self.vocabulario), 1)
+        if base ** n >= 2 ** 63:
+            raise ValueError(f'Vocabulário grande demais para contar sequências de {n} palavras.')
+        offsets = np.asarray(self.offsets).astype(np.int64)
+        partes_codigos, partes_contagens = [], []
+        for inicio in range(0, len(self), LINHAS_BLOCO_NGRAMAS):
+            fim = min(inicio + LINHAS_BLOCO_NGRAMAS, len(self))
+            primeiro, ultimo = offsets[inicio], offsets[fim]
+            ids = np.asarray(self.ids[primeiro:ultimo]).astype(np.int64)
+            janelas = len(ids) - n + 1
+            if janelas <= 0:
+                continue
+            codigos = ids[:janelas].copy()
+            for k in range(1, n):
+                codigos = codigos * base + ids[k:janelas + k]
+            # Só as janelas inteiras dentro de uma linha: fim da linha de cada posição >= posição + n
+            fim_linha = np.repeat(offsets[inicio + 1:fim + 1] - primeiro, np.diff(offsets[inicio:fim + 1]))
+            codigos, contagens = np.unique(codigos[np.arange(janelas) + n <= fim_linha[:janelas]], return_counts=True)
+            partes_codigos.append(codigos)
+            partes_contagens.append(contagens)
+        if not partes_codigos:
+            resultado = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        elif len(partes_codigos) == 1:
+            resultado = (partes_codigos[0], partes_contagens[0])
+        else:
+            codigos, inverso = np.unique(np.concatenate(partes_codigos), return_inverse=True)
+            contagens = np.bincount(inverso, weights=np.concatenate(partes_contagens)).astype(np.int64)
+            resultado = (codigos, contagens)
+        self._ngramas[n] = resultado
+        return resultado
+
+    # Códigos de contagens_ngramas de volta para o texto ('termo1 termo2')
+    def termos_ngramas(self, codigos, n=2):
+        base = max(len(self.vocabulario), 1)
+        posicoes = []
+        for _ in range(n):
+            posicoes.append((codigos % base).tolist())
+            codigos = codigos // base
+        vocabulario = self.vocabulario
+        return [' '.join(vocabulario[termo_id] for termo_id in ids) for ids in zip(*reversed(posicoes))]
+
+    # Os k n-gramas mais frequentes, no mesmo formato de frequencias() (Counter 'termo1 termo2' -> contagem)
+    def ngramas_frequentes(self, k, n=2):
+        codigos, contagens = self.contagens_ngramas(n)
+        escolhidos = maiores(contagens, k)
+        return Counter(dict(zip(self.termos_ngramas(codigos[escolhidos], n), contagens[escolhidos].tolist())))
+
+    # Colocações: os k bigramas com maior informação mútua pontual, PMI = log2(c(ab) * N / (c(a) * c(b))), isto é,
+    # os pares que aparecem juntos mais do que o acaso explicaria. Pares com menos de `minimo` ocorrências ficam
+    # de fora (o PMI exagera os raros). Devolve as contagens (Counter, como ngramas_frequentes) e o PMI de cada par.
+    def colocacoes(self, k, minimo=3):
+        codigos, contagens = self.contagens_ngramas(2)
+        base = max(len(self.vocabulario), 1)
+        unigramas = self.contagens()
+        pmi = np.log2(contagens * float(self.total_tokens) / (unigramas[codigos // base] * unigramas[codigos % base]))
+        pmi[(contagens < minimo) | (pmi <= 0)] = -np.inf
+        escolhidos = maiores(pmi, k)
+        escolhidos = escolhidos[np.isfinite(pmi[escolhidos])]
+        escolhidos = escolhidos[np.argsort(-pmi[escolhidos], kind='stable')]
+        termos = self.termos_ngramas(codigos[escolhidos], 2)
+        return Counter(dict(zip(termos, contagens[escolhidos].tolist()))), dict(zip(termos, pmi[escolhidos].tolist()))
+
+    # Frequências só dos termos pesquisados: O(termos pesquisados)
+    def filtrar(self, termos):
+        contagens = self.contagens()
+        ids_termos = self.ids_termos
+        return Counter({termo: int(contagens[ids_termos[termo]]) for termo in set(termos) if termo in ids_termos})
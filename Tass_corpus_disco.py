@@ -0,0 +1,400 @@
+import os
+import json
+import time
+import shutil
+import uuid
+import hashlib
+import tempfile
+import threading
+from array import array
+import math
+from collections import Counter
+import numpy as np
+from Tass_corpus import CorpusCodificado, codificar_termos
+from Tass_frequencias import ContagemAproximada
+
+# Corpus processado gravado em disco: ids dos termos (uint32) e início de cada linha (uint64) em arquivos binários
+# lidos por memory map, vocabulário em texto (um termo por linha) e frequências já somadas. Só o vocabulário fica
+# na memória do processo; os ids são paginados pelo sistema operacional sob demanda e as páginas são compartilhadas
+# por todos os workers do gunicorn que abrirem o mesmo corpus.
+PASTA_CORPORA = os.environ.get('TASS_PASTA_CORPORA', os.path.join(tempfile.gettempdir(), 'tass_corpora'))
+TTL_CORPORA = int(os.environ.get('TASS_SESSOES_TTL', 3600))
+TOKENS_POR_BLOCO = 1 << 20  # ids acumulados na memória antes de cada gravação
+LINHAS_POR_BLOCO = 10000  # linhas decodificadas de uma vez ao percorrer o corpus
+# Com TASS_LIMITE_TERMOS, os corpora do servidor são gravados como CorpusAproximado: memória limitada ao número
+# de termos contados, em vez de crescer com o vocabulário (ver ContagemAproximada). 0 (o padrão) é a contagem exata.
+LIMITE_TERMOS = int(os.environ.get('TASS_LIMITE_TERMOS', 0))
+
+# Recebe as linhas processadas (mesma interface append de CorpusCodificado) e grava os ids em blocos,
+# sem nunca manter o corpus inteiro na memória. Só escreve: a leitura é feita pelo corpus que fechar() devolve.
+class GravadorCorpus:
+    def __init__(self, pasta_base=PASTA_CORPORA):
+        self.identificador = uuid.uuid4().hex
+        self.pasta = os.path.join(pasta_base, self.identificador)
+        os.makedirs(self.pasta)
+        self.vocabulario = []  # id -> termo
+        self.ids_termos = {}  # termo -> id
+        self._arquivo_ids = open(os.path.join(self.pasta, 'ids.bin'), 'wb')
+        self._arquivo_offsets = open(os.path.join(self.pasta, 'offsets.bin'), 'wb')
+        self._arquivo_offsets.write(array('Q', [0]).tobytes())
+        self._ids = array('I')  # ids ainda não gravados
+        self._offsets = array('Q')  # fim das linhas ainda não gravadas
+        self._linhas = 0
+        self._gravados = 0  # ids já gravados em disco
+        self._total_contagens = np.zeros(0, dtype=np.int64)
+
+    def append(self, linha):
+        termos = linha.split() if isinstance(linha, str) else linha
+        self._ids.extend(codificar_termos(termos, self.vocabulario, self.ids_termos))
+        self._offsets.append(self._gravados + len(self._ids))
+        self._linhas += 1
+        if len(self._ids) >= TOKENS_POR_BLOCO:
+            self._gravar_bloco()
+
+    def __len__(self):
+        return self._linhas
+
+    @property
+    def total_tokens(self):
+        return self._gravados + len(self._ids)
+
+    def _gravar_bloco(self):
+        contagens = np.bincount(np.frombuffer(self._ids, dtype=np.uintc), minlength=len(self.vocabulario))
+        contagens[:len(self._total_contagens)] += self._total_contagens
+        self._total_contagens = contagens
+        self._arquivo_ids.write(self._ids.tobytes())
+        self._arquivo_offsets.write(self._offsets.tobytes())
+        self._gravados += len(self._ids)
+        self._ids = array('I')
+        self._offsets = array('Q')
+
+    def fechar(self):
+        self._gravar_bloco()
+        self._arquivo_ids.close()
+        self._arquivo_offsets.close()
+        contagens = np.zeros(len(self.vocabulario), dtype=np.int64)
+        contagens[:len(self._total_contagens)] = self._total_contagens
+        contagens.tofile(os.path.join(self.pasta, 'contagens.bin'))
+        with open(os.path.join(self.pasta, 'vocabulario.txt'), 'w', encoding='utf-8') as arquivo:
+            arquivo.write('\n'.join(self.vocabulario))
+        return CorpusEmDisco(self.pasta)
+
+    def descartar(self):
+        for arquivo in (self._arquivo_ids, self._arquivo_offsets):
+            arquivo.close()
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+def abrir_mmap(caminho, dtype):
+    # np.memmap não aceita arquivos vazios (corpus sem nenhum token)
+    if os.path.getsize(caminho) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(caminho, dtype=dtype, mode='r')
+
+# Corpus somente leitura sobre os arquivos gravados, com a mesma interface de CorpusCodificado
+class CorpusEmDisco(CorpusCodificado):
+    def __init__(self, pasta):
+        self.pasta = pasta
+        with open(os.path.join(pasta, 'vocabulario.txt'), encoding='utf-8') as arquivo:
+            conteudo = arquivo.read()
+        self.vocabulario = conteudo.split('\n') if conteudo else []
+        self.ids = abrir_mmap(os.path.join(pasta, 'ids.bin'), np.uint32)
+        self.offsets = abrir_mmap(os.path.join(pasta, 'offsets.bin'), np.uint64)
+        self._contagens = np.fromfile(os.path.join(pasta, 'contagens.bin'), dtype=np.int64)
+        self._ids_termos = None
+        self._ngramas = {}
+
+    # O índice termo -> id só é montado quando o filtro por lista precisa dele
+    @property
+    def ids_termos(self):
+        if self._ids_termos is None:
+            self._ids_termos = {termo: termo_id for termo_id, termo in enumerate(self.vocabulario)}
+        return self._ids_termos
+
+    def append(self, linha):
+        raise TypeError('CorpusEmDisco é somente leitura; use GravadorCorpus.')
+
+    def linha(self, i):
+        vocabulario = self.vocabulario
+        return ' '.join([vocabulario[termo_id] for termo_id in self.ids_linha(i).tolist()])
+
+    # Percorre o corpus decodificando blocos de linhas, com uma leitura contígua dos ids por bloco
+    def __iter__(self):
+        vocabulario = self.vocabulario
+        for inicio in range(0, len(self), LINHAS_POR_BLOCO):
+            offsets = self.offsets[inicio:inicio + LINHAS_POR_BLOCO + 1].tolist()
+            termos = [vocabulario[termo_id] for termo_id in self.ids[offsets[0]:offsets[-1]].tolist()]
+            base = offsets[0]
+            for a, b in zip(offsets, offsets[1:]):
+                yield ' '.join(termos[a - base:b - base])
+
+    # Memória própria do processo (o vocabulário); os ids ficam no cache de páginas do sistema
+    @property
+    def nbytes(self):
+        return self._contagens.nbytes + sum(len(termo) + 49 for termo in self.vocabulario)
+
+    def contagens(self):
+        return self._contagens
+
+# Corpus para vocabulários de cauda longa (hashtags, menções, erros de digitação): as linhas processadas ficam
+# em texto (linhas.txt) e só as frequências aproximadas dos termos mais comuns ficam na memória, com erro limitado
+# (Misra-Gries, ver ContagemAproximada). O aproximado.json é gravado por último e marca o corpus como completo.
+class GravadorAproximado:
+    def __init__(self, limite=LIMITE_TERMOS, pasta_base=PASTA_CORPORA):
+        self.identificador = uuid.uuid4().hex
+        self.pasta = os.path.join(pasta_base, self.identificador)
+        os.makedirs(self.pasta)
+        self._arquivo = open(os.path.join(self.pasta, 'linhas.txt'), 'w', encoding='utf-8')
+        self._frequencias = ContagemAproximada(limite)
+        self._linhas = 0
+
+    def append(self, linha):
+        termos = linha.split() if isinstance(linha, str) else linha
+        self._arquivo.write(' '.join(termos) + '\n')
+        self._frequencias.update(termos)
+        self._linhas += 1
+
+    def __len__(self):
+        return self._linhas
+
+    @property
+    def total_tokens(self):
+        return self._frequencias.total
+
+    def fechar(self):
+        self._arquivo.close()
+        frequencias = self._frequencias
+        dados = {'linhas': self._linhas, 'limite': frequencias.limite, 'total': frequencias.total,
+                 'erro_maximo': frequencias.erro_maximo, 'contagens': dict(frequencias.items())}
+        gravar_ponteiro(os.path.join(self.pasta, 'aproximado.json'), dados)
+        return CorpusAproximado(self.pasta)
+
+    def descartar(self):
+        self._arquivo.close()
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+# Corpus somente leitura gravado pelo GravadorAproximado. Oferece o que o servidor usa de CorpusEmDisco
+# (linhas, nuvem, filtro por lista e bigramas), mas as frequências vêm da ContagemAproximada: mais_frequentes
+# devolve o mínimo garantido de cada termo e filtrar devolve a própria ContagemAproximada, com o intervalo.
+# Os bigramas também são contados com memória limitada, percorrendo o texto na primeira consulta.
+class CorpusAproximado:
+    def __init__(self, pasta):
+        self.pasta = pasta
+        with open(os.path.join(pasta, 'aproximado.json'), encoding='utf-8') as arquivo:
+            dados = json.load(arquivo)
+        self._linhas = dados['linhas']
+        self.frequencias = ContagemAproximada.restaurar(dados['limite'], dados['total'], dados['erro_maximo'],
+                                                        dados['contagens'])
+        self._ngramas = {}
+
+    @property
+    def erro_maximo(self):
+        return self.frequencias.erro_maximo
+
+    @property
+    def limite(self):
+        return self.frequencias.limite
+
+    def __len__(self):
+        return self._linhas
+
+    def __bool__(self):
+        return self._linhas > 0
+
+    def __iter__(self):
+        with open(os.path.join(self.pasta, 'linhas.txt'), encoding='utf-8') as arquivo:
+            for linha in arquivo:
+                yield linha.rstrip('\n')
+
+    # Só fatias a partir do início (a prévia das primeiras linhas): o texto é lido em sequência
+    def __getitem__(self, indice):
+        if not isinstance(indice, slice) or indice.start or indice.step:
+            raise TypeError('CorpusAproximado só lê as primeiras linhas (corpus[:n]).')
+        linhas = []
+        for linha in self:
+            if indice.stop is not None and len(linhas) >= indice.stop:
+                break
+            linhas.append(linha)
+        return linhas
+
+    @property
+    def total_tokens(self):
+        return self.frequencias.total
+
+    @property
+    def nbytes(self):
+        return sum(len(termo) + 57 for termo, _ in self.frequencias.items())
+
+    def mais_frequentes(self, n):
+        return Counter(dict(self.frequencias.most_common(n)))
+
+    def filtrar(self, termos):
+        return self.frequencias.filtrar(termos)
+
+    def contagens_ngramas(self, n=2):
+        if n not in self._ngramas:
+            indice = ContagemAproximada(self.limite)
+            for linha in self:
+                termos = linha.split()
+                indice.update([' '.join(janela) for janela in zip(*(termos[k:] for k in range(n)))])
+            self._ngramas[n] = indice
+        return self._ngramas[n]
+
+    def ngramas_frequentes(self, k, n=2):
+        return Counter(dict(self.contagens_ngramas(n).most_common(k)))
+
+    # Mesmo PMI de CorpusCodificado.colocacoes, sobre as contagens aproximadas. Um termo que saiu da contagem
+    # de unigramas aparece pelo menos tantas vezes quanto o par, que é usado no lugar da sua contagem.
+    def colocacoes(self, k, minimo=3):
+        unigramas = self.frequencias
+        pmi = {}
+        for par, contagem in self.contagens_ngramas(2).items():
+            if contagem < minimo:
+                continue
+            a, b = par.split(' ')
+            valor = math.log2(contagem * float(self.total_tokens) / (max(unigramas[a], contagem) * max(unigramas[b], contagem)))
+            if valor > 0:
+                pmi[par] = valor
+        escolhidos = sorted(pmi, key=pmi.get, reverse=True)[:k]
+        pares = self.contagens_ngramas(2)
+        return Counter({par: pares[par] for par in escolhidos}), {par: pmi[par] for par in escolhidos}
+
+def novo_gravador():
+    return GravadorAproximado() if LIMITE_TERMOS else GravadorCorpus()
+
+# Grava as linhas processadas (strings ou listas de termos) direto em disco
+def gravar_linhas(linhas):
+    gravador = novo_gravador()
+    try:
+        for linha in linhas:
+            gravador.append(linha)
+        return gravador.fechar()
+    except BaseException:
+        gravador.descartar()
+        raise
+
+# Ponteiros para os corpora, pequenos JSONs em disco (visíveis para todos os workers):
+# - sessoes/: corpus atual de cada sessão e o modo de limpeza usado;
+# - resultados/: corpus já calculado para cada conteúdo de arquivo (hash) e modo, reaproveitado na troca
+#   de modo ou num novo envio do mesmo arquivo.
+# Um corpus sem nenhum ponteiro é apagado pela limpeza (quem ainda o tiver aberto continua lendo pelo memory map).
+PASTAS_PONTEIROS = ('sessoes', 'resultados')
+GRACA_CORPORA = 60  # segundos em que um corpus recém-gravado fica protegido antes de receber o ponteiro
+_abertos = {}  # pasta -> CorpusEmDisco já aberto neste worker
+_lock = threading.Lock()
+
+def caminho_ponteiro(tipo, chave):
+    nome = hashlib.sha1(str(chave).encode('utf-8')).hexdigest()  # as chaves vêm do navegador: nunca usadas como caminho
+    return os.path.join(PASTA_CORPORA, tipo, nome + '.json')
+
+def gravar_ponteiro(caminho, dados):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f'{caminho}.{uuid.uuid4().hex}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(dados, arquivo)
+    os.replace(temporario, caminho)
+
+def ler_ponteiro(caminho):
+    try:
+        with open(caminho, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+# Abre o corpus pelo nome da pasta, reaproveitando o já aberto neste worker (None se ele expirou)
+def abrir_pasta(nome):
+    pasta = os.path.join(PASTA_CORPORA, os.path.basename(nome))
+    with _lock:
+        corpus = _abertos.get(pasta)
+        if corpus is None:
+            try:
+                if os.path.exists(os.path.join(pasta, 'aproximado.json')):
+                    corpus = _abertos[pasta] = CorpusAproximado(pasta)
+                else:
+                    corpus = _abertos[pasta] = CorpusEmDisco(pasta)
+            except OSError:
+                return None
+    return corpus
+
+# Abre o corpus apontado e adia a expiração do ponteiro
+def abrir_ponteiro(caminho):
+    dados = ler_ponteiro(caminho)
+    if dados is None:
+        return None, None
+    corpus = abrir_pasta(dados['corpus'])
+    if corpus is None:
+        return None, None  # corpus expirado
+    try:
+        os.utime(caminho)
+    except OSError:
+        pass
+    return corpus, dados
+
+def publicar_corpus(sessao, corpus, modo):
+    remover_expirados()
+    gravar_ponteiro(caminho_ponteiro('sessoes', sessao), {'corpus': os.path.basename(corpus.pasta), 'modo': modo})
+    with _lock:
+        _abertos[corpus.pasta] = corpus
+
+# Devolve (corpus, modo) da sessão, ou (None, None) se ela ainda não processou nenhum arquivo
+def abrir_corpus(sessao):
+    corpus, dados = abrir_ponteiro(caminho_ponteiro('sessoes', sessao))
+    return (corpus, dados['modo']) if corpus is not None else (None, None)
+
+# Cache dos resultados por conteúdo: chave é o hash do arquivo enviado. A contagem aproximada entra na chave,
+# para que um resultado exato e um aproximado (ou com outro limite) nunca sejam trocados um pelo outro.
+def chave_resultado(chave, modo):
+    return f'{chave}:{modo}:aproximado{LIMITE_TERMOS}' if LIMITE_TERMOS else f'{chave}:{modo}'
+
+def registrar_resultado(chave, modo, corpus):
+    gravar_ponteiro(caminho_ponteiro('resultados', chave_resultado(chave, modo)), {'corpus': os.path.basename(corpus.pasta)})
+
+def buscar_resultado(chave, modo):
+    if not chave:
+        return None
+    return abrir_ponteiro(caminho_ponteiro('resultados', chave_resultado(chave, modo)))[0]
+
+def remover_corpus(pasta):
+    with _lock:
+        _abertos.pop(pasta, None)
+    shutil.rmtree(pasta, ignore_errors=True)
+
+def remover_expirados():
+    agora = time.time()
+    em_uso = set()
+    for tipo in PASTAS_PONTEIROS:
+        pasta_ponteiros = os.path.join(PASTA_CORPORA, tipo)
+        if not os.path.isdir(pasta_ponteiros):
+            continue
+        for nome in os.listdir(pasta_ponteiros):
+            caminho = os.path.join(pasta_ponteiros, nome)
+            try:
+                if os.path.getmtime(caminho) < agora - TTL_CORPORA:
+                    os.remove(caminho)
+                    continue
+            except OSError:
+                continue  # removido por outro worker
+            dados = ler_ponteiro(caminho)
+            if dados:
+                em_uso.add(dados['corpus'])
+    for nome in os.listdir(PASTA_CORPORA):
+        pasta = os.path.join(PASTA_CORPORA, nome)
+        if nome in PASTAS_PONTEIROS or nome in em_uso:
+            continue
+        try:
+            # Corpus completo e sem ponteiro: apagado depois da carência. Corpus ainda sendo gravado
+            # (sem vocabulario.txt ou aproximado.json): só se o ids.bin (ou linhas.txt) parou de ser
+            # modificado há mais que o TTL.
+            final = [nome for nome in ('vocabulario.txt', 'aproximado.json') if os.path.exists(os.path.join(pasta, nome))]
+            if final:
+                expirado = os.path.getmtime(os.path.join(pasta, final[0])) < agora - GRACA_CORPORA
+            else:
+                em_gravacao = 'ids.bin' if os.path.exists(os.path.join(pasta, 'ids.bin')) else 'linhas.txt'
+                expirado = os.path.getmtime(os.path.join(pasta, em_gravacao)) < agora - TTL_CORPORA
+        except OSError:
+            expirado = True  # pasta incompleta ou já removida
+        if expirado:
+            remover_corpus(pasta)
+    # Corpora apagados por outros workers também saem da lista dos abertos neste worker
+    with _lock:
+        for pasta in [pasta for pasta in _abertos if not os.path.isdir(pasta)]:
+            del _abertos[pasta]
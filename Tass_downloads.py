@@ -0,0 +1,56 @@
+import zlib
+import flask
+
+# Downloads servidos por rotas do Flask em vez do dcc.Download: o arquivo é gerado e enviado em blocos
+# (sem montar a string inteira nem passar pela resposta JSON do Dash), com compressão gzip opcional (?gzip=1).
+TAMANHO_BLOCO = 256 * 1024
+LINHAS_POR_BLOCO_CSV = 10000
+
+# Junta as linhas de texto em blocos de bytes de ~TAMANHO_BLOCO, uma linha por linha do arquivo
+def blocos_linhas(linhas, tamanho_bloco=TAMANHO_BLOCO):
+    bloco = []
+    tamanho = 0
+    for linha in linhas:
+        bloco.append(linha)
+        tamanho += len(linha) + 1
+        if tamanho >= tamanho_bloco:
+            yield ('\n'.join(bloco) + '\n').encode('utf-8')
+            bloco = []
+            tamanho = 0
+    if bloco:
+        yield ('\n'.join(bloco) + '\n').encode('utf-8')
+
+# DataFrame em CSV (mesmo formato do download anterior: separador ';' e sem índice), algumas linhas por vez.
+# Com o corpus, a coluna tokens (que não fica guardada na sessão) é refeita dos ids a cada bloco.
+def blocos_csv(data, sep=';', linhas_por_bloco=LINHAS_POR_BLOCO_CSV, corpus=None, separador_tokens=' '):
+    if len(data) == 0:
+        yield com_tokens(data, 0, corpus, separador_tokens).to_csv(index=False, sep=sep).encode('utf-8')
+    for inicio in range(0, len(data), linhas_por_bloco):
+        parte = com_tokens(data.iloc[inicio:inicio + linhas_por_bloco], inicio, corpus, separador_tokens)
+        yield parte.to_csv(index=False, header=inicio == 0, sep=sep).encode('utf-8')
+
+# As linhas da tabela com a coluna tokens tirada do corpus (a linha i da tabela é a linha i do corpus)
+def com_tokens(parte, inicio, corpus, separador_tokens=' '):
+    if corpus is None:
+        return parte
+    return parte.assign(tokens=corpus.linhas_unidas(inicio, inicio + len(parte), separador_tokens))
+
+def comprimir_gzip(blocos, nivel=6):
+    compressor = zlib.compressobj(nivel, zlib.DEFLATED, 31)  # wbits=31: formato gzip
+    for bloco in blocos:
+        dados = compressor.compress(bloco)
+        if dados:
+            yield dados
+    yield compressor.flush()
+
+def pediu_gzip():
+    return flask.request.args.get('gzip') == '1'
+
+def resposta_download(blocos, nome_arquivo, mimetype, gzip=False):
+    if gzip:
+        blocos = comprimir_gzip(blocos)
+        nome_arquivo += '.gz'
+        mimetype = 'application/gzip'
+    resposta = flask.Response(flask.stream_with_context(blocos), mimetype=mimetype)
+    resposta.headers['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    return resposta
@@ -0,0 +1,82 @@
+from collections import Counter
+import numpy as np
+
+# Índice termo -> frequência, montado uma única vez ao final do processamento do arquivo.
+# Aceita linhas como strings separadas por espaço (tokens_list) ou como listas de palavras.
+# Com limite_termos, a contagem é aproximada e usa memória fixa (ver ContagemAproximada).
+def contar_frequencias(linhas, limite_termos=None):
+    indice = ContagemAproximada(limite_termos) if limite_termos else Counter()
+    for linha in linhas:
+        indice.update(linha.split() if isinstance(linha, str) else linha)
+    return indice
+
+# Contagem dos termos mais frequentes com memória limitada (Misra-Gries), para vocabulários de cauda longa
+# (hashtags, menções, erros de digitação) que não cabem num Counter. Guarda no máximo 2 * limite termos:
+# ao passar disso, a (limite + 1)-ésima maior contagem é subtraída de todos e os que chegam a zero saem.
+# A soma do que foi subtraído (erro_maximo) limita o erro: para cada termo, contagem <= real <= contagem + erro_maximo,
+# e erro_maximo <= total / (limite + 1). Todo termo com frequência real acima de erro_maximo está no índice.
+class ContagemAproximada:
+    def __init__(self, limite):
+        self.limite = limite
+        self.total = 0
+        self.erro_maximo = 0
+        self._contagens = Counter()
+
+    # Contagem já feita e guardada (ex.: o JSON do CorpusAproximado em Tass_corpus_disco)
+    @classmethod
+    def restaurar(cls, limite, total, erro_maximo, contagens):
+        indice = cls(limite)
+        indice.total = total
+        indice.erro_maximo = erro_maximo
+        indice._contagens = Counter(contagens)
+        return indice
+
+    def update(self, termos):
+        if not isinstance(termos, (list, tuple)):
+            termos = list(termos)
+        self.total += len(termos)
+        self._contagens.update(termos)
+        if len(self._contagens) > 2 * self.limite:
+            self._compactar()
+
+    def _compactar(self):
+        termos = list(self._contagens)
+        valores = np.fromiter(self._contagens.values(), dtype=np.int64, count=len(termos))
+        if len(valores) <= self.limite:
+            return
+        corte = int(np.partition(valores, len(valores) - self.limite - 1)[len(valores) - self.limite - 1])
+        restantes = valores - corte
+        self._contagens = Counter({termos[i]: int(restantes[i]) for i in np.flatnonzero(restantes > 0).tolist()})
+        self.erro_maximo += corte
+
+    def __getitem__(self, termo):
+        return self._contagens[termo]
+
+    def __contains__(self, termo):
+        return termo in self._contagens
+
+    def __len__(self):
+        return len(self._contagens)
+
+    def __bool__(self):
+        return bool(self._contagens)
+
+    def values(self):
+        return self._contagens.values()
+
+    def items(self):
+        return self._contagens.items()
+
+    def most_common(self, n=None):
+        return self._contagens.most_common(n)
+
+    # Faixa em que está a frequência real do termo
+    def intervalo(self, termo):
+        contagem = self._contagens[termo]
+        return contagem, contagem + self.erro_maximo
+
+    # Só os termos pesquisados, com o mesmo erro_maximo (um termo ausente pode ter até erro_maximo ocorrências)
+    def filtrar(self, termos):
+        contagens = self._contagens
+        return ContagemAproximada.restaurar(self.limite, self.total, self.erro_maximo,
+                                            {termo: contagens[termo] for termo in set(termos) if termo in contagens})
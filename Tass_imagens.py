@@ -0,0 +1,147 @@
+import os
+import re
+import time
+import uuid
+import hashlib
+import tempfile
+import threading
+import concurrent.futures
+from contextlib import nullcontext
+import flask
+from PIL import Image
+from Tass_nuvem import gerar_layout
+
+# Nuvens de palavras servidas por URL em vez de data URI em base64 dentro do JSON dos callbacks.
+# Cada nuvem é gravada uma vez em disco (PNG) com o nome igual ao hash das frequências que a geraram:
+# a mesma nuvem pedida de novo (troca de modo, mesmo arquivo, mesma lista) não é redesenhada.
+# A rota /nuvem/<chave> entrega PNG, JPEG ou WebP conforme o cabeçalho Accept do navegador (ou ?formato=),
+# com ETag e Cache-Control, e as conversões também ficam guardadas. A pasta é compartilhada pelos workers.
+PASTA_NUVENS = os.environ.get('TASS_PASTA_NUVENS', os.path.join(tempfile.gettempdir(), 'tass_nuvens'))
+TTL_NUVENS = int(os.environ.get('TASS_SESSOES_TTL', 3600))
+VERSAO_LAYOUT = 'wordcloud-600x300-white'  # muda a chave de todas as nuvens se gerar_layout mudar
+THREADS_NUVENS = int(os.environ.get('TASS_NUVENS_THREADS', 2))
+
+# formato -> (formato do PIL, mimetype, opções de gravação), na ordem de preferência da negociação
+FORMATOS = {'webp': ('WEBP', 'image/webp', {'quality': 80}),
+            'jpeg': ('JPEG', 'image/jpeg', {'quality': 80}),
+            'png': ('PNG', 'image/png', {})}
+
+# A chave vem da URL: só hashes são aceitos, nunca caminhos
+padrao_chave = re.compile(r'^[0-9a-f]{64}$')
+
+def chave_nuvem(frequencias):
+    sha = hashlib.sha256(VERSAO_LAYOUT.encode('utf-8'))
+    for termo, contagem in sorted(frequencias.items()):
+        sha.update(f'{termo}\t{contagem}\n'.encode('utf-8'))
+    return sha.hexdigest()
+
+def caminho_nuvem(chave, formato='png'):
+    return os.path.join(PASTA_NUVENS, f'{chave}.{formato}')
+
+def url_nuvem(chave):
+    return f'/nuvem/{chave}'
+
+# A nuvem já está no cache? O acesso adia a expiração
+def nuvem_existe(chave):
+    try:
+        os.utime(caminho_nuvem(chave))
+        return True
+    except OSError:
+        return False
+
+def gravar_arquivo(caminho, imagem, formato):
+    pil_formato, _, opcoes = FORMATOS[formato]
+    temporario = f'{caminho}.{uuid.uuid4().hex}.tmp'
+    imagem.save(temporario, format=pil_formato, **opcoes)
+    os.replace(temporario, caminho)
+
+def gravar_nuvem(chave, wordcloud):
+    os.makedirs(PASTA_NUVENS, exist_ok=True)
+    remover_expirados()
+    gravar_arquivo(caminho_nuvem(chave), wordcloud.to_image(), 'png')
+
+# As nuvens são desenhadas num pool de threads do worker. Quem pede uma nuvem que já está sendo desenhada
+# espera o mesmo desenho em vez de começar outro; agendar_nuvem permite desenhar de antemão, sem esperar
+# (ex.: a nuvem da Tokenização calculada junto com a Lematização). O posicionamento das palavras segura o GIL:
+# o pool não deixa uma nuvem mais rápida nem desenha várias em paralelo, só evita desenhos repetidos.
+_executor = None
+_pid_executor = None
+_em_andamento = {}  # chave -> futuro do desenho
+_lock = threading.Lock()
+
+def obter_executor():
+    global _executor, _pid_executor
+    # Threads não sobrevivem ao fork do gunicorn: cada worker cria o seu pool
+    if _executor is None or _pid_executor != os.getpid():
+        _executor = concurrent.futures.ThreadPoolExecutor(max_workers=THREADS_NUVENS, thread_name_prefix='tass-nuvem')
+        _pid_executor = os.getpid()
+    return _executor
+
+def etapa(medicao, nome):
+    return medicao.etapa(nome) if medicao is not None else nullcontext()
+
+def desenhar_nuvem(chave, frequencias, medicao):
+    try:
+        with etapa(medicao, 'nuvem_layout'):
+            wordcloud = gerar_layout(frequencias)
+        with etapa(medicao, 'nuvem_png'):
+            gravar_nuvem(chave, wordcloud)
+    finally:
+        with _lock:
+            _em_andamento.pop(chave, None)
+
+# Devolve a chave e o futuro do desenho (None se a nuvem já estiver no cache)
+def agendar_nuvem(frequencias, medicao=None):
+    with etapa(medicao, 'nuvem_chave'):
+        chave = chave_nuvem(frequencias)
+    with _lock:
+        futuro = _em_andamento.get(chave)
+        if futuro is None and not nuvem_existe(chave):
+            futuro = _em_andamento[chave] = obter_executor().submit(desenhar_nuvem, chave, frequencias, medicao)
+    return chave, futuro
+
+# Devolve a URL da nuvem dessas frequências, desenhando-a só se ainda não estiver no cache
+def salvar_nuvem(frequencias, medicao=None):
+    chave, futuro = agendar_nuvem(frequencias, medicao)
+    if futuro is not None:
+        futuro.result()
+    return url_nuvem(chave)
+
+# Caminho da nuvem no formato pedido; as conversões são feitas a partir do PNG uma vez só
+def obter_nuvem(chave, formato):
+    caminho = caminho_nuvem(chave, formato)
+    if not os.path.exists(caminho):
+        with Image.open(caminho_nuvem(chave)) as imagem:
+            gravar_arquivo(caminho, imagem.convert('RGB'), formato)
+    return caminho
+
+def formato_pedido():
+    formato = flask.request.args.get('formato', '').lower().replace('jpg', 'jpeg')
+    if formato in FORMATOS:
+        return formato
+    mimetypes = {mimetype: nome for nome, (_, mimetype, _) in FORMATOS.items()}
+    melhor = flask.request.accept_mimetypes.best_match(list(mimetypes))
+    return mimetypes.get(melhor, 'png')
+
+def remover_expirados():
+    limite = time.time() - TTL_NUVENS
+    for nome in os.listdir(PASTA_NUVENS):
+        caminho = os.path.join(PASTA_NUVENS, nome)
+        try:
+            if os.path.getmtime(caminho) < limite:
+                os.remove(caminho)
+        except OSError:
+            pass  # arquivo removido por outro worker
+
+def registrar_rota(server):
+    @server.route('/nuvem/<chave>')
+    def servir_nuvem(chave):
+        if not padrao_chave.match(chave) or not nuvem_existe(chave):
+            return 'Nuvem de palavras não encontrada ou expirada.', 404
+        formato = formato_pedido()
+        resposta = flask.send_file(obter_nuvem(chave, formato), mimetype=FORMATOS[formato][1],
+                                   etag=f'{chave}-{formato}', conditional=True, max_age=TTL_NUVENS)
+        # O conteúdo de uma chave nunca muda; o formato depende do Accept
+        resposta.headers['Cache-Control'] = f'public, max-age={TTL_NUVENS}, immutable'
+        resposta.vary.add('Accept')
+        return resposta
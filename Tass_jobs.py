@@ -0,0 +1,194 @@
+import os
+import re
+import json
+import time
+import uuid
+import tempfile
+import threading
+import concurrent.futures
+
+# Quantos processamentos longos podem rodar ao mesmo tempo em cada worker do servidor
+# (o mesmo modelo SpaCy é compartilhado pelas threads, por isso o padrão é um por vez)
+N_JOBS = int(os.environ.get('TASS_JOBS', 1))
+
+# O job roda no worker que o recebeu, mas o estado (progresso, prévia, resultado) e o pedido de cancelamento
+# ficam em disco, em <pasta>/<id>.json e <pasta>/<id>.cancelar: a consulta do dcc.Interval e o botão Cancelar
+# funcionam em qualquer worker do gunicorn. O estado é regravado no máximo a cada INTERVALO_ESTADO segundos
+# enquanto o job avança, e sempre que ele muda de situação ou publica a prévia.
+PASTA_JOBS = os.environ.get('TASS_PASTA_JOBS', os.path.join(tempfile.gettempdir(), 'tass_jobs'))
+INTERVALO_ESTADO = 0.5
+
+# O id vem do navegador: só ids no formato gerado aqui são usados como nome de arquivo
+padrao_id = re.compile(r'^[0-9a-f]{32}$')
+
+class JobCancelado(Exception):
+    pass
+
+# Processamento em segundo plano: guarda o progresso (processadas / total, em linhas ou em bytes lidos do arquivo)
+# e o pedido de cancelamento.
+# O resultado devolvido pela função do job (e a prévia) precisa ser serializável em JSON.
+class Job:
+    def __init__(self, sessao, total=0, pasta=PASTA_JOBS, job_id=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.sessao = sessao
+        self.total = total
+        self.processadas = 0
+        self.estado = 'fila'  # fila, executando, concluido, cancelado, erro
+        self.resultado = None
+        self.erro = None
+        self.previa = None  # resultado parcial publicado pela função do job enquanto ela ainda roda
+        self.pasta = pasta
+        self._cancelar = threading.Event()
+        self._previa_ou_fim = threading.Event()
+        self._gravado = 0.0
+
+    @property
+    def finalizado(self):
+        return self.estado in ('concluido', 'cancelado', 'erro')
+
+    def caminho(self, extensao='json'):
+        return os.path.join(self.pasta, f'{self.id}.{extensao}')
+
+    def gravar(self):
+        dados = {'sessao': self.sessao, 'total': self.total, 'processadas': self.processadas, 'estado': self.estado,
+                 'resultado': self.resultado, 'erro': self.erro, 'previa': self.previa}
+        caminho = self.caminho()
+        temporario = f'{caminho}.{uuid.uuid4().hex}.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(dados, arquivo)
+        os.replace(temporario, caminho)
+        self._gravado = time.monotonic()
+
+    # Estado gravado por outro worker (ou None se o job não existe ou já expirou)
+    @classmethod
+    def carregar(cls, pasta, job_id):
+        try:
+            with open(os.path.join(pasta, f'{job_id}.json'), encoding='utf-8') as arquivo:
+                dados = json.load(arquivo)
+        except (OSError, ValueError):
+            return None
+        job = cls(dados['sessao'], dados['total'], pasta, job_id)
+        job.processadas, job.estado = dados['processadas'], dados['estado']
+        job.resultado, job.erro, job.previa = dados['resultado'], dados['erro'], dados['previa']
+        return job
+
+    def cancelar(self):
+        self._cancelar.set()
+        with open(self.caminho('cancelar'), 'w'):
+            pass
+
+    # O pedido pode ter chegado a este worker (Event) ou a outro (arquivo .cancelar)
+    def cancelado(self):
+        if not self._cancelar.is_set() and os.path.exists(self.caminho('cancelar')):
+            self._cancelar.set()
+        return self._cancelar.is_set()
+
+    # Interrompe a função do job se ele foi cancelado; chamado antes de publicar o resultado
+    def verificar_cancelamento(self):
+        if self.cancelado():
+            raise JobCancelado()
+
+    # Chamado pela função do job a cada linha: atualiza o progresso e interrompe se o job foi cancelado.
+    # O disco só é consultado (e o estado regravado) a cada INTERVALO_ESTADO segundos.
+    def atualizar(self, processadas):
+        if self._cancelar.is_set():
+            raise JobCancelado()
+        self.processadas = processadas
+        if time.monotonic() - self._gravado >= INTERVALO_ESTADO:
+            self.verificar_cancelamento()
+            self.gravar()
+
+    def avancar(self, linhas=1):
+        self.atualizar(self.processadas + linhas)
+
+    def progresso(self):
+        return self.processadas / self.total if self.total else 0.0
+
+    def publicar_previa(self, previa):
+        self.previa = previa
+        self.gravar()
+        self._previa_ou_fim.set()
+
+    # Espera até `segundos` pela prévia (ou pelo fim do job, o que vier antes)
+    def aguardar_previa(self, segundos):
+        self._previa_ou_fim.wait(segundos)
+        return self.previa
+
+class FilaJobs:
+    def __init__(self, max_workers=N_JOBS, ttl=3600, pasta=PASTA_JOBS):
+        self.ttl = ttl
+        self.pasta = pasta
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tass-job')
+        self._jobs = {}  # jobs deste worker
+        self._lock = threading.Lock()
+
+    # funcao(job, *args) roda em segundo plano; o valor devolvido fica em job.resultado
+    def enviar(self, sessao, funcao, *args, total=0):
+        os.makedirs(self.pasta, exist_ok=True)
+        job = Job(sessao, total, self.pasta)
+        job.gravar()
+        with self._lock:
+            self._remover_antigos()
+            self._jobs[job.id] = job
+        self._executor.submit(self._executar, job, funcao, args)
+        return job.id
+
+    # O job deste worker, ou o estado gravado pelo worker que o executa
+    def obter(self, job_id):
+        if not job_id or not padrao_id.match(job_id):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None else Job.carregar(self.pasta, job_id)
+
+    def cancelar(self, job_id):
+        job = self.obter(job_id)
+        if job is not None and not job.finalizado:
+            job.cancelar()
+            if job.estado == 'fila' and job_id in self._jobs:
+                job.estado = 'cancelado'
+                job.gravar()
+                job._previa_ou_fim.set()
+
+    def encerrar(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job._cancelar.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _executar(self, job, funcao, args):
+        if job.estado == 'cancelado':
+            return
+        if job.cancelado():  # cancelado em outro worker enquanto esperava na fila
+            job.estado = 'cancelado'
+            job.gravar()
+            job._previa_ou_fim.set()
+            return
+        job.estado = 'executando'
+        job.gravar()
+        try:
+            job.resultado = funcao(job, *args)
+            job.estado = 'concluido'
+        except JobCancelado:
+            job.estado = 'cancelado'
+        except Exception as e:
+            job.erro = str(e)
+            job.estado = 'erro'
+        finally:
+            job.gravar()
+            job._previa_ou_fim.set()
+
+    # Jobs finalizados saem da memória; os arquivos de estado expiram pelo TTL (inclusive os de outros workers)
+    def _remover_antigos(self):
+        for job_id, job in list(self._jobs.items()):
+            if job.finalizado:
+                del self._jobs[job_id]
+        limite = time.time() - self.ttl
+        for nome in os.listdir(self.pasta):
+            caminho = os.path.join(self.pasta, nome)
+            try:
+                if os.path.getmtime(caminho) < limite:
+                    os.remove(caminho)
+            except OSError:
+                pass  # removido por outro worker
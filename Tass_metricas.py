@@ -0,0 +1,164 @@
+import os
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:  # Windows: sem getrusage, a memória de pico não é medida
+    resource = None
+
+# Métricas de desempenho de cada worker do servidor no formato texto do Prometheus (rota /metrics).
+# Cada chamada instrumentada registra a duração total, a duração de cada etapa e o tamanho da entrada
+# (bytes, linhas e tokens), por modo de limpeza. A memória aparece de duas formas:
+# - tass_memoria_pico_processo_bytes: pico de memória residente do processo desde que ele começou (ru_maxrss),
+#   que só cresce e soma todas as threads; não diz nada sobre uma chamada isolada;
+# - tass_memoria_pico_chamada_bytes (opcional, TASS_METRICAS_MEMORIA=1): pico das alocações feitas pelo Python
+#   e pelo NumPy durante a chamada, acima do uso no início, medido com tracemalloc. O pico do tracemalloc é do
+#   processo inteiro, então chamadas que se sobrepõem a outras (threads, jobs) não são medidas. O tracemalloc
+#   deixa as alocações mais lentas, por isso fica desligado por padrão.
+MEDIR_MEMORIA = os.environ.get('TASS_METRICAS_MEMORIA', '0') == '1'
+if MEDIR_MEMORIA:
+    tracemalloc.start()
+
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+LIMITES_TAMANHO = (100, 1000, 10000, 100000, 1000000, 10000000, 100000000, 1000000000)
+
+def escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def formatar_rotulos(rotulos):
+    return '{' + ','.join(f'{nome}="{escapar(valor)}"' for nome, valor in rotulos) + '}'
+
+class Histograma:
+    def __init__(self, nome, ajuda, limites):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.limites = limites
+        self._series = {}  # rótulos -> [contagens acumuladas por limite, soma, total]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * len(self.limites), 0.0, 0]
+            for i, limite in enumerate(self.limites):
+                if valor <= limite:
+                    serie[0][i] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exportar(self):
+        linhas = [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} histogram']
+        with self._lock:
+            series = sorted((chave, list(contagens), soma, total) for chave, (contagens, soma, total) in self._series.items())
+        for chave, contagens, soma, total in series:
+            for limite, contagem in zip(self.limites, contagens):
+                linhas.append(f'{self.nome}_bucket{formatar_rotulos(chave + (("le", limite),))} {contagem}')
+            linhas.append(f'{self.nome}_bucket{formatar_rotulos(chave + (("le", "+Inf"),))} {total}')
+            linhas.append(f'{self.nome}_sum{formatar_rotulos(chave)} {soma}')
+            linhas.append(f'{self.nome}_count{formatar_rotulos(chave)} {total}')
+        return linhas
+
+segundos_funcao = Histograma('tass_funcao_segundos', 'Duracao total de cada chamada instrumentada.', LIMITES_SEGUNDOS)
+segundos_etapa = Histograma('tass_etapa_segundos', 'Duracao de cada etapa do processamento.', LIMITES_SEGUNDOS)
+entrada_bytes = Histograma('tass_entrada_bytes', 'Tamanho da entrada em bytes.', LIMITES_TAMANHO)
+entrada_linhas = Histograma('tass_entrada_linhas', 'Quantidade de linhas da entrada.', LIMITES_TAMANHO)
+entrada_tokens = Histograma('tass_entrada_tokens', 'Quantidade de tokens produzidos ou consultados.', LIMITES_TAMANHO)
+memoria_pico = Histograma('tass_memoria_pico_chamada_bytes',
+                          'Pico de memoria alocada durante a chamada acima do uso no inicio (tracemalloc, '
+                          'so chamadas sem sobreposicao).', LIMITES_TAMANHO)
+histogramas = [segundos_funcao, segundos_etapa, entrada_bytes, entrada_linhas, entrada_tokens, memoria_pico]
+
+# Marcos da inicialização do processo (carga e aquecimento do modelo, tempo até a primeira requisição)
+marcos = {}
+
+def registrar_marco(nome, segundos):
+    marcos[nome] = segundos
+
+# Pico de memória residente do processo em bytes desde o início (ru_maxrss é em KB no Linux e em bytes no macOS)
+def pico_memoria():
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico if pico > 1 << 32 else pico * 1024
+
+# Medições de memória em andamento: quem começa com outra em andamento (ou vê outra começar) não é registrado
+_medicoes_memoria = []
+_lock_memoria = threading.Lock()
+
+def iniciar_memoria(medicao):
+    with _lock_memoria:
+        for outra in _medicoes_memoria:
+            outra.sobreposta = True
+        medicao.sobreposta = bool(_medicoes_memoria)
+        _medicoes_memoria.append(medicao)
+        if not medicao.sobreposta:
+            tracemalloc.reset_peak()
+            medicao.memoria_inicial = tracemalloc.get_traced_memory()[0]
+
+# Pico acima do uso inicial, ou None se a chamada se sobrepôs a outra
+def finalizar_memoria(medicao):
+    with _lock_memoria:
+        _medicoes_memoria.remove(medicao)
+        if medicao.sobreposta:
+            return None
+        return max(tracemalloc.get_traced_memory()[1] - medicao.memoria_inicial, 0)
+
+class Medicao:
+    def __init__(self, funcao, modo):
+        self.funcao = funcao
+        self.modo = modo  # pode ser trocado durante a medição (ex.: modo lido da sessão)
+        self.sobreposta = False
+        self.memoria_inicial = 0
+
+    @contextmanager
+    def etapa(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            segundos_etapa.observar(time.perf_counter() - inicio, funcao=self.funcao, modo=self.modo, etapa=nome)
+
+    def tamanho(self, tamanho_bytes=None, linhas=None, tokens=None):
+        rotulos = {'funcao': self.funcao, 'modo': self.modo}
+        if tamanho_bytes is not None:
+            entrada_bytes.observar(tamanho_bytes, **rotulos)
+        if linhas is not None:
+            entrada_linhas.observar(linhas, **rotulos)
+        if tokens is not None:
+            entrada_tokens.observar(tokens, **rotulos)
+
+@contextmanager
+def medir(funcao, modo='nenhum'):
+    medicao = Medicao(funcao, modo)
+    if MEDIR_MEMORIA:
+        iniciar_memoria(medicao)
+    inicio = time.perf_counter()
+    try:
+        yield medicao
+    finally:
+        segundos_funcao.observar(time.perf_counter() - inicio, funcao=medicao.funcao, modo=medicao.modo)
+        if MEDIR_MEMORIA:
+            pico = finalizar_memoria(medicao)
+            if pico is not None:
+                memoria_pico.observar(pico, funcao=medicao.funcao, modo=medicao.modo)
+
+def exportar():
+    linhas = []
+    for histograma in histogramas:
+        linhas.extend(histograma.exportar())
+    if marcos:
+        linhas += ['# HELP tass_inicializacao_segundos Duracao de cada marco da inicializacao do processo.',
+                   '# TYPE tass_inicializacao_segundos gauge']
+        linhas += [f'tass_inicializacao_segundos{formatar_rotulos([("marco", nome)])} {segundos}'
+                   for nome, segundos in sorted(marcos.items())]
+    pico = pico_memoria()
+    if pico is not None:
+        linhas += ['# HELP tass_memoria_pico_processo_bytes Pico de memoria residente do processo desde o inicio '
+                   '(high-water mark de todas as threads, nao por chamada).',
+                   '# TYPE tass_memoria_pico_processo_bytes gauge',
+                   f'tass_memoria_pico_processo_bytes {pico}']
+    return '\n'.join(linhas) + '\n'
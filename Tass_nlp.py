@@ -0,0 +1,422 @@
+import os
+import re
+import sys
+import time
+import threading
+import unicodedata
+from collections import OrderedDict, deque
+import spacy
+import spacy.cli
+from Tass_metricas import registrar_marco
+
+# Modelo usado e onde procurá-lo sem internet: instalado como pacote (o pt_core_news_sm vem no requirements.txt,
+# então o deploy já sobe com ele), na pasta modelos/ ao lado do código ou num caminho indicado em TASS_MODELO.
+# O download em tempo de execução só é tentado se TASS_BAIXAR_MODELO=1; o modelo vazio é o último recurso.
+MODELO = os.environ.get('TASS_MODELO', 'pt_core_news_sm')
+PASTA_MODELOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modelos')
+BAIXAR_MODELO = os.environ.get('TASS_BAIXAR_MODELO', '0') == '1'
+COMPONENTES_EXCLUIDOS = ["ner", "parser", "attribute_ruler", "tagger"]
+
+# Textos curtos processados logo após a carga, para que a primeira requisição não pague a inicialização do pipeline
+TEXTOS_AQUECIMENTO = ['Os gatos pretos dormem na casa bonita.', 'O atendimento foi ótimo e a entrega rápida!']
+
+# Situação do modelo, consultada pela rota /ready: nao_carregado, carregando, pronto, degradado (só o modelo vazio,
+# sem lematização) ou erro
+estado_modelo = {'estado': 'nao_carregado', 'origem': None, 'lematizacao': None,
+                 'segundos_carga': None, 'segundos_aquecimento': None, 'erro': None}
+
+def load_spacy_model(model_name=MODELO):
+    for candidato in [model_name, os.path.join(PASTA_MODELOS, model_name)]:
+        try:
+            modelo = spacy.load(candidato, exclude=COMPONENTES_EXCLUIDOS)
+            estado_modelo.update(origem=candidato, lematizacao=True)
+            return modelo
+        except OSError:
+            pass
+    if BAIXAR_MODELO:
+        spacy.cli.download(model_name)
+        estado_modelo.update(origem=model_name, lematizacao=True)
+        return spacy.load(model_name, exclude=COMPONENTES_EXCLUIDOS)
+    # Sem o modelo e sem internet: modelo vazio do português, que vem com o próprio SpaCy.
+    # Tokeniza igual, mas sem classes gramaticais, então a Lematização devolve as palavras sem lematizar:
+    # o estado fica 'degradado' (a rota /ready responde 503) e os resultados não entram no cache por conteúdo.
+    estado_modelo.update(origem='spacy.blank("pt")', lematizacao=False)
+    print(f'Modelo {model_name} não encontrado: usando spacy.blank("pt"), sem lematização '
+          '(instale as dependências do requirements.txt)', file=sys.stderr)
+    return spacy.blank('pt')
+
+# O modelo só é carregado no primeiro uso (ou por iniciar_modelo), nunca na importação do módulo
+nlp = None
+_lock_modelo = threading.Lock()
+
+def obter_modelo():
+    global nlp
+    if nlp is None:
+        with _lock_modelo:
+            if nlp is None:
+                estado_modelo.update(estado='carregando', erro=None)
+                try:
+                    inicio = time.perf_counter()
+                    modelo = load_spacy_model()
+                    estado_modelo['segundos_carga'] = time.perf_counter() - inicio
+                    inicio = time.perf_counter()
+                    for doc in modelo.pipe(TEXTOS_AQUECIMENTO):
+                        filtrar_doc(doc)
+                    estado_modelo['segundos_aquecimento'] = time.perf_counter() - inicio
+                except Exception as e:
+                    estado_modelo.update(estado='erro', erro=str(e))
+                    raise
+                registrar_marco('modelo_carga', estado_modelo['segundos_carga'])
+                registrar_marco('modelo_aquecimento', estado_modelo['segundos_aquecimento'])
+                nlp = modelo
+                estado_modelo['estado'] = 'pronto' if estado_modelo['lematizacao'] else 'degradado'
+    return nlp
+
+def modelo_pronto():
+    return estado_modelo['estado'] == 'pronto'
+
+# Falso com o modelo vazio: a Lematização só separa as palavras
+def lematizacao_disponivel():
+    return estado_modelo['lematizacao'] is True
+
+def _carregar_modelo():
+    try:
+        obter_modelo()
+    except Exception:
+        pass  # o erro fica em estado_modelo e aparece na rota /ready
+
+# Quando carregar o modelo: 'importacao' carrega agora (com o preload do gunicorn isso acontece no processo
+# mestre e os workers compartilham a memória do modelo), 'segundo_plano' carrega numa thread sem atrasar
+# a subida do servidor e 'sob_demanda' deixa para o primeiro processamento
+def iniciar_modelo(modo='segundo_plano'):
+    if modo == 'importacao':
+        obter_modelo()
+    elif modo == 'segundo_plano':
+        threading.Thread(target=_carregar_modelo, name='tass-modelo', daemon=True).start()
+
+# Parâmetros do nlp.pipe (podem ser ajustados pelas variáveis de ambiente do servidor)
+BATCH_SIZE = int(os.environ.get('TASS_BATCH_SIZE', 1000))
+N_PROCESS = int(os.environ.get('TASS_N_PROCESS', 1))
+
+# Tamanho máximo do cache de lemas (0, o padrão, desliga) e quantas análises iguais tornam um token confiável
+LIMITE_CACHE_LEMAS = int(os.environ.get('TASS_CACHE_LEMAS', 0))
+OCORRENCIAS_CACHE_LEMAS = int(os.environ.get('TASS_CACHE_OCORRENCIAS', 3))
+
+# Quantas linhas já lematizadas ficam guardadas para servir as repetições (0 desliga)
+LIMITE_LINHAS_REPETIDAS = int(os.environ.get('TASS_CACHE_LINHAS', 100000))
+
+stopwords_set = {'a', 'à', 'ao', 'aos', 'aquela', 'aquelas', 'aquele', 'aquele#s', 'aquilo', 'as', 'às', 'até', 'com',
+'como', 'da', 'das', 'de', 'dela', 'delas', 'dele', 'deles', 'depois', 'do', 'dos', 'e', 'é', 'ela', 'elas', 'ele',
+'eles', 'em', 'entre', 'eu', 'isso', 'isto', 'já', 'lhe', 'lhes', 'mais', 'mas', 'me', 'mesmo', 'meu', 'meus', 'minha', 'minhas', 'muito', 'na', 'não', 'nas', 'nem',
+'no', 'nos', 'nós', 'nossa', 'nossas', 'nosso', 'nossos', 'num', 'numa', 'o', 'os', 'ou', 'para', 'pela', 'pelas',
+'pelo', 'pelos', 'por', 'qual', 'quando', 'que', 'quem', 'são', 'se', 'seja', 'sem', 'seu', 'seus', 'só', 'somos', 'sou', 'sua', 'suas',
+'também', 'te', 'tem', 'tém', 'teu', 'teus',  'tu', 'tua', 'tuas', 'um', 'uma', 'você', 'vocês', 'vos', "'", 'pra', 'eh', 'vcs', 'lá', 'né', 'q', 'o', 'tá', 'co', 't', 's', 'rt', 'pq',
+'ta', 'tô', 'ihh', 'ih', 'otc', 'vc', 'https', 'n', 'pois', 'porque',"b", "c", "d", "f", "g", "h", "j", "k", "l", "m", "n", "p", "q", "r", "s", "t", "v", "w", "x", "y", "z"}
+
+def filtrar_doc(doc):
+    filtered_words = []
+    for token in doc:
+        if token.is_alpha and token.text.lower() not in stopwords_set:
+            if token.pos_ in ['ADJ', 'NOUN']:  # Lematizar apenas adjetivos e substantivos
+                filtered_words.append(token.lemma_)
+            else:
+                filtered_words.append(token.text)  # Repetir a palavra para outras POS
+    return ' '.join(filtered_words)
+
+# Cache LRU token normalizado -> (pos, lema, is_alpha), compartilhado pelas chamadas ao nlp. Opcional
+# (TASS_CACHE_LEMAS): a classe gramatical depende do contexto e o cache responde sem ele, então o resultado pode
+# diferir do modelo. Para reduzir isso, um token só é servido depois de receber a mesma análise várias vezes
+# e tokens com análises divergentes nunca são servidos. hits/misses contam linhas: um acerto é uma linha
+# montada inteira pelo cache, sem passar pelo modelo.
+class CacheLemas:
+    def __init__(self, limite=LIMITE_CACHE_LEMAS, ocorrencias=OCORRENCIAS_CACHE_LEMAS):
+        self.limite = limite
+        self.ocorrencias = ocorrencias
+        self.hits = 0
+        self.misses = 0
+        self._entradas = OrderedDict()  # token -> [pos, lema, is_alpha, ocorrencias, ambiguo]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entradas)
+
+    @property
+    def ativo(self):
+        return self.limite > 0
+
+    # Devolve a forma final do token (lema ou texto) ou None se ainda for preciso rodar o modelo
+    def consultar(self, texto):
+        with self._lock:
+            entrada = self._entradas.get(texto)
+            if entrada is None or entrada[4] or entrada[3] < self.ocorrencias:
+                return None
+            self._entradas.move_to_end(texto)
+            pos, lema = entrada[0], entrada[1]
+        return lema if pos in ['ADJ', 'NOUN'] else texto
+
+    def contar(self, acerto):
+        with self._lock:
+            if acerto:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def registrar(self, doc):
+        if not self.ativo:
+            return
+        with self._lock:
+            for token in doc:
+                if not token.is_alpha or token.text in stopwords_set:
+                    continue
+                entrada = self._entradas.get(token.text)
+                if entrada is None:
+                    self._entradas[token.text] = [token.pos_, token.lemma_, True, 1, False]
+                else:
+                    if (entrada[0], entrada[1]) != (token.pos_, token.lemma_):
+                        entrada[4] = True
+                    entrada[3] += 1
+                    self._entradas.move_to_end(token.text)
+            while len(self._entradas) > self.limite:
+                self._entradas.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def estatisticas(self):
+        consultas = self.hits + self.misses
+        return {'ativo': self.ativo, 'tamanho': len(self._entradas), 'limite': self.limite,
+                'hits': self.hits, 'misses': self.misses,
+                'taxa_acerto': self.hits / consultas if consultas else 0.0}
+
+cache_lemas = CacheLemas()
+
+# Linhas repetidas (retweets, mensagens copiadas e coladas) vão ao modelo uma vez só: o resultado de cada
+# linha (já em minúsculas, exatamente o texto que o SpaCy recebe) é guardado num LRU e repetido nas demais
+# ocorrências, na posição original, então as frequências continuam contando todas as linhas.
+# Um objeto por processamento, para que as contagens da taxa de repetição sejam só daquele arquivo.
+class LinhasRepetidas:
+    def __init__(self, limite=LIMITE_LINHAS_REPETIDAS):
+        self.limite = limite
+        self.linhas = 0
+        self.repetidas = 0
+        self._resultados = OrderedDict()
+
+    # Conta a linha e devolve o resultado já calculado para ela, ou None
+    def consultar(self, texto):
+        self.linhas += 1
+        resultado = self._resultados.get(texto)
+        if resultado is not None:
+            self._resultados.move_to_end(texto)
+            self.repetidas += 1
+        return resultado
+
+    def guardar(self, texto, resultado):
+        if self.limite <= 0:
+            return
+        self._resultados[texto] = resultado
+        if len(self._resultados) > self.limite:
+            self._resultados.popitem(last=False)
+
+    def estatisticas(self):
+        return {'linhas': self.linhas, 'processadas': self.linhas - self.repetidas, 'repetidas': self.repetidas,
+                'taxa_repetidas': self.repetidas / self.linhas if self.linhas else 0.0}
+
+# Tenta montar a linha só com o tokenizador e o cache; devolve None se algum token precisar do modelo.
+# Tokens não alfabéticos e stopwords são descartados sem depender da análise morfológica.
+def limpar_pelo_cache(texto):
+    filtered_words = []
+    for token in obter_modelo().tokenizer(texto):
+        if not token.is_alpha or token.text in stopwords_set:
+            continue
+        forma = cache_lemas.consultar(token.text)
+        if forma is None:
+            cache_lemas.contar(False)
+            return None
+        filtered_words.append(forma)
+    cache_lemas.contar(True)
+    return ' '.join(filtered_words)
+
+def clean_text(text, usar_cache=True):
+    text = text.lower()
+    usar_cache = usar_cache and cache_lemas.ativo
+    if usar_cache:
+        cached = limpar_pelo_cache(text)
+        if cached is not None:
+            return cached
+    doc = obter_modelo()(text)
+    if usar_cache:
+        cache_lemas.registrar(doc)
+    return filtrar_doc(doc)
+
+# Tokenização: minúsculas, acentos na forma composta (NFC) e tudo que não é letra ou número trocado por espaço,
+# para que "bom," e "bom" sejam a mesma palavra, sem as stopwords
+padrao_palavras = re.compile(r'[^\W_]+')
+
+def separar_palavras(linha):
+    return [palavra for palavra in padrao_palavras.findall(unicodedata.normalize('NFC', linha).lower())
+            if palavra not in stopwords_set]
+
+def clean_text_2(text):
+    return ' '.join(separar_palavras(text))
+
+# Tamanho máximo da memória de palavras do Tokenizador, quantas palavras formam cada janela da taxa de palavras
+# novas e a taxa acima da qual a memória é abandonada
+LIMITE_TERMOS_TOKENIZADOS = 200000
+JANELA_TERMOS_TOKENIZADOS = 10000
+TAXA_MAXIMA_TERMOS_NOVOS = 0.15
+
+# Tokenização de um arquivo inteiro. Em textos em que as palavras se repetem muito, cada palavra como aparece no
+# texto (com maiúsculas e pontuação) é limpa uma vez só e guardada: para cada linha sobram um split e uma consulta
+# ao dicionário por palavra (a NFC e as minúsculas podem ser aplicadas palavra a palavra porque nenhuma das duas
+# junta ou separa caracteres através dos espaços). Em textos de cauda longa (hashtags, menções, erros de digitação)
+# quase toda palavra é nova e limpar palavra a palavra sai bem mais caro que a linha inteira: se, depois da primeira
+# janela, mais de TAXA_MAXIMA_TERMOS_NOVOS das palavras de uma janela não estiverem guardadas, a memória é
+# descartada e o resto do arquivo usa separar_palavras. Cheia, a memória só deixa de receber palavras novas.
+class Tokenizador:
+    def __init__(self):
+        self.termos = {}  # palavra como aparece no texto -> palavras limpas; None quando abandonada
+        self._janela = 0
+        self._novos = 0
+        self._primeira_janela = True
+
+    def separar(self, linha):
+        termos = self.termos
+        if termos is None:
+            return separar_palavras(linha)
+        palavras = []
+        novos = 0
+        brutos = linha.split()
+        for termo in brutos:
+            limpas = termos.get(termo)
+            if limpas is None:
+                novos += 1
+                limpas = separar_palavras(termo)
+                if len(termos) < LIMITE_TERMOS_TOKENIZADOS:
+                    termos[termo] = limpas
+            palavras += limpas
+        self._novos += novos
+        self._janela += len(brutos)
+        if self._janela >= JANELA_TERMOS_TOKENIZADOS:
+            self._avaliar()
+        return palavras
+
+    def _avaliar(self):
+        if not self._primeira_janela and self._novos > TAXA_MAXIMA_TERMOS_NOVOS * self._janela:
+            self.termos = None
+        self._primeira_janela = False
+        self._janela = 0
+        self._novos = 0
+
+# Devolve, na mesma ordem, a lista de palavras de cada linha (mesmo resultado de clean_text_2)
+# (depois que o Tokenizador abandona a memória, o resto das linhas vai direto para separar_palavras)
+def tokenizar_linhas(linhas):
+    linhas = iter(linhas)
+    tokenizador = Tokenizador()
+    for linha in linhas:
+        yield tokenizador.separar(linha)
+        if tokenizador.termos is None:
+            yield from map(separar_palavras, linhas)
+
+# Lematização em lote: as linhas passam pelo nlp.pipe em vez de uma chamada ao SpaCy por linha.
+# Aceita qualquer iterável (inclusive geradores) e devolve os resultados na mesma ordem.
+# Com o cache de lemas ligado, as linhas são tratadas em blocos e só as que o cache não resolve vão ao nlp.pipe.
+# Linhas repetidas nunca são enviadas ao modelo de novo (ver LinhasRepetidas).
+def iterar_lematizacao(linhas, batch_size=None, n_process=None, usar_cache=True, repetidas=None):
+    batch_size = batch_size or BATCH_SIZE
+    n_process = n_process or N_PROCESS
+    repetidas = repetidas if repetidas is not None else LinhasRepetidas()
+    textos = (linha.lower() for linha in linhas)
+    # Sem o cache de lemas não há consulta ao tokenizador antes do modelo. Com vários processos cada bloco
+    # abriria um novo pool do SpaCy, então o cache também fica de fora.
+    if not usar_cache or not cache_lemas.ativo or n_process > 1:
+        yield from _lematizar_fluxo(textos, batch_size, n_process, repetidas)
+        return
+
+    bloco = []
+    for texto in textos:
+        bloco.append(texto)
+        if len(bloco) >= batch_size:
+            yield from _lematizar_bloco(bloco, batch_size, n_process, repetidas)
+            bloco = []
+    if bloco:
+        yield from _lematizar_bloco(bloco, batch_size, n_process, repetidas)
+
+def _lematizar_bloco(bloco, batch_size, n_process, repetidas):
+    resultados = [None] * len(bloco)
+    pendentes = {}  # texto -> posições no bloco; cada texto diferente vai ao modelo uma vez
+    for i, texto in enumerate(bloco):
+        resultado = repetidas.consultar(texto)
+        if resultado is None and texto in pendentes:
+            repetidas.repetidas += 1
+            pendentes[texto].append(i)
+            continue
+        if resultado is None:
+            resultado = limpar_pelo_cache(texto)
+            if resultado is None:
+                pendentes[texto] = [i]
+                continue
+            repetidas.guardar(texto, resultado)
+        resultados[i] = resultado
+    docs = obter_modelo().pipe(pendentes, batch_size=batch_size, n_process=n_process)
+    for (texto, posicoes), doc in zip(pendentes.items(), docs):
+        cache_lemas.registrar(doc)
+        resultado = filtrar_doc(doc)
+        repetidas.guardar(texto, resultado)
+        for i in posicoes:
+            resultados[i] = resultado
+    return resultados
+
+# Sem o cache de lemas, as linhas seguem num fluxo contínuo para um único nlp.pipe (um só pool de processos).
+# As repetições de uma linha ainda no modelo esperam na fila o resultado da primeira ocorrência.
+def _lematizar_fluxo(textos, batch_size, n_process, repetidas):
+    fila = deque()  # [texto, resultado] na ordem de entrada
+    enviados = deque()
+    aguardando = {}  # texto enviado ao modelo -> entradas da fila que esperam o resultado
+
+    def novos():
+        for texto in textos:
+            entrada = [texto, repetidas.consultar(texto)]
+            fila.append(entrada)
+            if entrada[1] is not None:
+                continue
+            if texto in aguardando:
+                repetidas.repetidas += 1
+                aguardando[texto].append(entrada)
+                continue
+            aguardando[texto] = [entrada]
+            enviados.append(texto)
+            yield texto
+
+    for doc in obter_modelo().pipe(novos(), batch_size=batch_size, n_process=n_process):
+        texto = enviados.popleft()
+        resultado = filtrar_doc(doc)
+        repetidas.guardar(texto, resultado)
+        for entrada in aguardando.pop(texto):
+            entrada[1] = resultado
+        while fila and fila[0][1] is not None:
+            yield fila.popleft()[1]
+    while fila:
+        yield fila.popleft()[1]
+
+# progresso, se informado, é chamado a cada linha lematizada (ex.: Job.avancar dos processamentos em segundo plano).
+# destino recebe os resultados via append (uma lista nova por padrão, ou um CorpusCodificado).
+def lematizar_linhas(linhas, batch_size=None, n_process=None, usar_cache=True, progresso=None, destino=None):
+    inicio = time.perf_counter()
+    tokens = destino if destino is not None else []
+    repetidas = LinhasRepetidas()
+    for resultado in iterar_lematizacao(linhas, batch_size, n_process, usar_cache, repetidas):
+        if progresso is not None:
+            progresso()
+        tokens.append(resultado)
+    segundos = time.perf_counter() - inicio
+
+    # Vazão do processamento, exibida junto com a pré-visualização
+    estatisticas = {'linhas': len(tokens),
+                    'segundos': segundos,
+                    'linhas_por_segundo': len(tokens) / segundos if segundos > 0 else 0.0,
+                    'cache': cache_lemas.estatisticas(),
+                    'repetidas': repetidas.estatisticas()}
+    return tokens, estatisticas
@@ -0,0 +1,68 @@
+import io
+import types
+import threading
+from PIL import ImageFont
+from wordcloud import WordCloud
+from wordcloud.wordcloud import FONT_PATH
+
+# Nuvem de palavras montada direto das frequências já calculadas (termo -> contagem),
+# sem juntar o texto numa string única e sem a segunda tokenização feita pelo WordCloud.generate.
+# O posicionamento das palavras e a codificação da imagem ficam separados para poderem ser medidos.
+# Só os TERMOS_NUVEM mais frequentes entram na nuvem (o padrão do WordCloud): as frequências passadas ao desenho
+# não precisam ter o vocabulário inteiro.
+TERMOS_NUVEM = 200
+CONFIGURACAO = {'width': 600, 'height': 300, 'background_color': 'white', 'max_words': TERMOS_NUVEM, 'font_path': FONT_PATH}
+
+# O WordCloud chama ImageFont.truetype a cada tentativa de encaixar uma palavra (e de novo em to_image),
+# relendo o arquivo da fonte centenas de vezes por nuvem. As fontes passam a ser carregadas uma vez por
+# (arquivo, tamanho) e reaproveitadas por todas as nuvens do processo. As funções de fonte do Pillow
+# não soltam o GIL, então o mesmo objeto pode ser usado por várias threads.
+_fontes = {}
+
+class FontesEmCache:
+    TransposedFont = ImageFont.TransposedFont
+
+    @staticmethod
+    def truetype(font_path, size):
+        fonte = _fontes.get((font_path, size))
+        if fonte is None:
+            fonte = _fontes[(font_path, size)] = ImageFont.truetype(font_path, size)
+        return fonte
+
+# O módulo wordcloud não é alterado: só as nuvens desta classe usam o cache. Os dois métodos que carregam fontes
+# são os do WordCloud, com o nome ImageFont apontando para FontesEmCache num dicionário de globais próprio.
+# Se uma versão futura do wordcloud deixar de usar ImageFont.truetype, a nuvem sai igual, só sem o cache.
+def _com_fontes_em_cache(metodo):
+    globais = dict(metodo.__globals__, ImageFont=FontesEmCache)
+    return types.FunctionType(metodo.__code__, globais, metodo.__name__, metodo.__defaults__, metodo.__closure__)
+
+class NuvemFontesEmCache(WordCloud):
+    generate_from_frequencies = _com_fontes_em_cache(WordCloud.generate_from_frequencies)
+    to_image = _com_fontes_em_cache(WordCloud.to_image)
+
+def gerar_layout(frequencias):
+    return NuvemFontesEmCache(**CONFIGURACAO).generate_from_frequencies(frequencias)
+
+def codificar_imagem(wordcloud, formato='JPEG', **opcoes_imagem):
+    img = io.BytesIO()
+    wordcloud.to_image().save(img, format=formato, **opcoes_imagem)
+    return img.getvalue()
+
+def renderizar_nuvem(frequencias, formato='JPEG', **opcoes_imagem):
+    return codificar_imagem(gerar_layout(frequencias), formato, **opcoes_imagem)
+
+# Deixa o renderizador pronto antes da primeira nuvem: a primeira nuvem do processo importa o matplotlib
+# (mapa de cores) e as fontes de todos os tamanhos possíveis são carregadas de uma vez
+def aquecer_renderizador():
+    modelo = NuvemFontesEmCache(**CONFIGURACAO)
+    for tamanho in range(modelo.min_font_size, modelo.height + 1):
+        FontesEmCache.truetype(CONFIGURACAO['font_path'], tamanho)
+    renderizar_nuvem({'tass': 3, 'texto': 2, 'nuvem': 1})
+
+# Mesmos modos de iniciar_modelo (Tass_nlp): com 'importacao' e o preload do gunicorn o aquecimento
+# acontece no processo mestre e os workers já nascem com as fontes carregadas
+def iniciar_renderizador(modo='segundo_plano'):
+    if modo == 'importacao':
+        aquecer_renderizador()
+    elif modo == 'segundo_plano':
+        threading.Thread(target=aquecer_renderizador, name='tass-nuvem', daemon=True).start()
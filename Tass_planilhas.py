@@ -0,0 +1,53 @@
+import os
+import pandas as pd
+
+# Leitura de planilhas em lotes: só a coluna de texto é lida (as demais nem são convertidas) e cada lote
+# de linhas segue para a limpeza assim que é lido, então a memória usada depende do tamanho do lote
+# e não do tamanho do arquivo. CSV com pd.read_csv(usecols, chunksize); XLSX com o modo somente leitura
+# do openpyxl, que percorre as linhas da planilha sem carregá-la inteira.
+LINHAS_POR_LOTE = int(os.environ.get('TASS_LOTE_LINHAS', 10000))
+
+class ColunaAusente(ValueError):
+    pass
+
+def mensagem_coluna(coluna):
+    return f'O arquivo deve ter uma coluna chamada {coluna}.'
+
+# fonte: caminho ou arquivo aberto (ex.: io.BytesIO com o conteúdo enviado). Gera pd.Series com os textos.
+def ler_lotes_csv(fonte, coluna='text', linhas_por_lote=LINHAS_POR_LOTE):
+    try:
+        leitor = pd.read_csv(fonte, usecols=[coluna], dtype={coluna: str}, chunksize=linhas_por_lote)
+    except ValueError as e:
+        if 'usecols' in str(e).lower():
+            raise ColunaAusente(mensagem_coluna(coluna)) from e
+        raise
+    with leitor:
+        for lote in leitor:
+            yield lote[coluna]
+
+def ler_lotes_xlsx(fonte, coluna='text', linhas_por_lote=LINHAS_POR_LOTE):
+    from openpyxl import load_workbook
+    planilha = load_workbook(fonte, read_only=True, data_only=True)
+    try:
+        # Primeira aba, como o pd.read_excel
+        linhas = planilha.worksheets[0].iter_rows(values_only=True)
+        cabecalho = next(linhas, ())
+        nomes = [str(nome) if nome is not None else None for nome in cabecalho]
+        if coluna not in nomes:
+            raise ColunaAusente(mensagem_coluna(coluna))
+        indice = nomes.index(coluna)
+        lote = []
+        for linha in linhas:
+            lote.append(linha[indice] if indice < len(linha) else None)
+            if len(lote) >= linhas_por_lote:
+                yield pd.Series(lote, dtype=object, name=coluna)
+                lote = []
+        if lote:
+            yield pd.Series(lote, dtype=object, name=coluna)
+    finally:
+        planilha.close()
+
+def ler_lotes(fonte, extensao, coluna='text', linhas_por_lote=LINHAS_POR_LOTE):
+    if extensao.lower().lstrip('.') == 'xlsx':
+        return ler_lotes_xlsx(fonte, coluna, linhas_por_lote)
+    return ler_lotes_csv(fonte, coluna, linhas_por_lote)
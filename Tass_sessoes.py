@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+# Limites do armazenamento de resultados (podem ser ajustados pelas variáveis de ambiente do servidor)
+LIMITE_MB_SESSOES = int(os.environ.get('TASS_SESSOES_MB', 512))
+TTL_SESSOES = int(os.environ.get('TASS_SESSOES_TTL', 3600))
+
+# Estimativa do espaço ocupado por um resultado (listas de strings, dicionários, DataFrames, arrays)
+def estimar_tamanho(valor):
+    if hasattr(valor, 'memory_usage'):  # DataFrame/Series do pandas
+        uso = valor.memory_usage(deep=True)
+        return int(uso.sum()) if hasattr(uso, 'sum') else int(uso)
+    if hasattr(valor, 'nbytes'):  # arrays do NumPy
+        return int(valor.nbytes)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(estimar_tamanho(k) + estimar_tamanho(v) for k, v in valor.items())
+    if isinstance(valor, (list, tuple, set, frozenset)):
+        return sys.getsizeof(valor) + sum(estimar_tamanho(item) for item in valor)
+    return sys.getsizeof(valor)
+
+# Resultados guardados por sessão no servidor, no lugar das variáveis globais compartilhadas.
+# Cada sessão é um dicionário chave -> valor; sessões expiram após o TTL e, quando o limite de
+# memória é ultrapassado, as menos usadas recentemente são descartadas primeiro.
+class ArmazemSessoes:
+    def __init__(self, limite_bytes=LIMITE_MB_SESSOES * 1024 * 1024, ttl=TTL_SESSOES):
+        self.limite_bytes = limite_bytes
+        self.ttl = ttl
+        self.bytes_usados = 0
+        self.descartes = 0
+        self._sessoes = OrderedDict()  # sessao -> {'valores': {}, 'tamanhos': {}, 'acesso': t}
+        self._lock = threading.Lock()
+
+    def __contains__(self, sessao):
+        with self._lock:
+            self._expirar()
+            return sessao in self._sessoes
+
+    def salvar(self, sessao, chave, valor):
+        tamanho = estimar_tamanho(valor)
+        with self._lock:
+            entrada = self._sessoes.setdefault(sessao, {'valores': {}, 'tamanhos': {}, 'acesso': 0.0})
+            self.bytes_usados += tamanho - entrada['tamanhos'].get(chave, 0)
+            entrada['valores'][chave] = valor
+            entrada['tamanhos'][chave] = tamanho
+            entrada['acesso'] = time.monotonic()
+            self._sessoes.move_to_end(sessao)
+            self._expirar()
+            # A sessão atual nunca é descartada para abrir espaço para ela mesma
+            while self.bytes_usados > self.limite_bytes and len(self._sessoes) > 1:
+                self._descartar(next(iter(self._sessoes)))
+
+    def obter(self, sessao, chave, padrao=None):
+        with self._lock:
+            self._expirar()
+            entrada = self._sessoes.get(sessao)
+            if entrada is None or chave not in entrada['valores']:
+                return padrao
+            entrada['acesso'] = time.monotonic()
+            self._sessoes.move_to_end(sessao)
+            return entrada['valores'][chave]
+
+    def remover(self, sessao):
+        with self._lock:
+            if sessao in self._sessoes:
+                self._descartar(sessao)
+
+    def estatisticas(self):
+        with self._lock:
+            return {'sessoes': len(self._sessoes), 'bytes_usados': self.bytes_usados,
+                    'limite_bytes': self.limite_bytes, 'descartes': self.descartes}
+
+    def _descartar(self, sessao):
+        entrada = self._sessoes.pop(sessao)
+        self.bytes_usados -= sum(entrada['tamanhos'].values())
+        self.descartes += 1
+
+    # As sessões ficam em ordem de uso, então as expiradas estão sempre no início
+    def _expirar(self):
+        limite = time.monotonic() - self.ttl
+        while self._sessoes:
+            sessao, entrada = next(iter(self._sessoes.items()))
+            if entrada['acesso'] >= limite:
+                break
+            self._descartar(sessao)
+
+armazem = ArmazemSessoes()
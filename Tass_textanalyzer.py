@@ -1,25 +1,25 @@
+import time
+# Momento em que o aplicativo começou a ser importado, para medir o tempo até a primeira requisição
+inicio_importacao = time.time()
+
 import dash
 from dash import dcc, html
 from dash.dependencies import Input, Output, State
-import base64
-import io
-from wordcloud import WordCloud
+from dash import ctx
+import flask
+import os
+import atexit
 from collections import Counter
-import spacy
-import spacy.cli
-
-def load_spacy_model(model_name="pt_core_news_sm"):
-    try:
-        return spacy.load(model_name, exclude=["ner", "parser", "attribute_ruler", "tagger"])
-    except OSError:
-        spacy.cli.download(model_name)
-        return spacy.load(model_name, exclude=["ner", "parser", "attribute_ruler", "tagger"])
-
-# Carregar o modelo SpaCy uma vez
-nlp = load_spacy_model()
-
-# Variável global para armazenar os dados do arquivo CSV
-tokens_list = ""
+import uuid
+from Tass_nlp import lematizar_linhas, tokenizar_linhas, Tokenizador, iniciar_modelo, modelo_pronto, lematizacao_disponivel, estado_modelo
+from Tass_uploads import salvar_stream, caminho_upload, ler_linhas, ler_linhas_posicao, ler_inicio, hash_upload, UploadInvalido
+from Tass_jobs import FilaJobs
+from Tass_corpus_disco import CorpusAproximado, novo_gravador, gravar_linhas, publicar_corpus, abrir_corpus, abrir_pasta, registrar_resultado, buscar_resultado
+from Tass_nuvem import iniciar_renderizador, TERMOS_NUVEM
+from Tass_imagens import salvar_nuvem, agendar_nuvem, registrar_rota as registrar_rota_nuvens
+from Tass_metricas import medir, registrar_marco, exportar as exportar_metricas
+from Tass_downloads import blocos_linhas, resposta_download, pediu_gzip
+from Tass_frequencias import ContagemAproximada
 
 # Estilos utilizados
 page_style = {'backgroundImage': 'url("https://img.freepik.com/fotos-gratis/fundo-preto-abstrato-da-grade-digital_53876-97647.jpg")', 
@@ -31,37 +31,66 @@ page_style = {'backgroundImage': 'url("https://img.freepik.com/fotos-gratis/fund
             'color': 'white'}
 text_style = {'margin': '10px auto','textAlign': 'center', 'fontSize': '20px','fontFamily': 'Roboto','whiteSpace': 'pre-wrap','width': '80%','color': '#A9A9A9'}
 
-stopwords_set = {'a', 'à', 'ao', 'aos', 'aquela', 'aquelas', 'aquele', 'aquele#s', 'aquilo', 'as', 'às', 'até', 'com', 
-'como', 'da', 'das', 'de', 'dela', 'delas', 'dele', 'deles', 'depois', 'do', 'dos', 'e', 'é', 'ela', 'elas', 'ele', 
-'eles', 'em', 'entre', 'eu', 'isso', 'isto', 'já', 'lhe', 'lhes', 'mais', 'mas', 'me', 'mesmo', 'meu', 'meus', 'minha', 'minhas', 'muito', 'na', 'não', 'nas', 'nem', 
-'no', 'nos', 'nós', 'nossa', 'nossas', 'nosso', 'nossos', 'num', 'numa', 'o', 'os', 'ou', 'para', 'pela', 'pelas', 
-'pelo', 'pelos', 'por', 'qual', 'quando', 'que', 'quem', 'são', 'se', 'seja', 'sem', 'seu', 'seus', 'só', 'somos', 'sou', 'sua', 'suas', 
-'também', 'te', 'tem', 'tém', 'teu', 'teus',  'tu', 'tua', 'tuas', 'um', 'uma', 'você', 'vocês', 'vos', "'", 'pra', 'eh', 'vcs', 'lá', 'né', 'q', 'o', 'tá', 'co', 't', 's', 'rt', 'pq', 
-'ta', 'tô', 'ihh', 'ih', 'otc', 'vc', 'https', 'n', 'pois', 'porque',"b", "c", "d", "f", "g", "h", "j", "k", "l", "m", "n", "p", "q", "r", "s", "t", "v", "w", "x", "y", "z"}
-
-def clean_text(text):
-    doc = nlp(text.lower())
-    filtered_words = []
-    for token in doc:
-        if token.is_alpha and token.text.lower() not in stopwords_set:
-            if token.pos_ in ['ADJ', 'NOUN']:  # Lematizar apenas adjetivos e substantivos
-                filtered_words.append(token.lemma_)
-            else:
-                filtered_words.append(token.text)  # Repetir a palavra para outras POS
-    return ' '.join(filtered_words)
-
-def clean_text_2(text):
-    words = text.lower().split()
-    filtered_words = [word for word in words if word not in stopwords_set]
-    
-    return ' '.join(filtered_words)
-
 # Criar o aplicativo Dash
 app = dash.Dash(__name__)
 server = app.server
+registrar_rota_nuvens(server)  # /nuvem/<chave>: imagens das nuvens de palavras (ver Tass_imagens)
+
+# Carregamento do modelo SpaCy (ver iniciar_modelo) e aquecimento do desenho das nuvens. O gunicorn.conf.py usa
+# 'importacao' junto com o preload, para os dois acontecerem uma vez no processo mestre; no servidor de
+# desenvolvimento eles acontecem em segundo plano.
+iniciar_modelo(os.environ.get('TASS_CARREGAR_MODELO', 'segundo_plano'))
+iniciar_renderizador(os.environ.get('TASS_CARREGAR_MODELO', 'segundo_plano'))
+primeira_requisicao = None
+
+@server.before_request
+def registrar_primeira_requisicao():
+    global primeira_requisicao
+    if primeira_requisicao is None:
+        primeira_requisicao = time.time() - inicio_importacao
+        registrar_marco('primeira_requisicao', primeira_requisicao)
+
+# Prontidão para o balanceador/orquestrador: 200 só quando o modelo já foi carregado e aquecido.
+# Sem o modelo de português (estado 'degradado', só o modelo vazio) a resposta também é 503.
+@server.route('/ready')
+def ready_route():
+    pronto = modelo_pronto()
+    return flask.jsonify(pronto=pronto, primeira_requisicao_segundos=primeira_requisicao, **estado_modelo), 200 if pronto else 503
+
+# Fila para a lematização completa, que roda fora da requisição do navegador. O job roda no worker que recebeu
+# o arquivo, mas o progresso, a prévia e o cancelamento ficam em disco e são vistos por todos os workers (ver Tass_jobs).
+fila_jobs = FilaJobs()
+atexit.register(fila_jobs.encerrar)
+
+# Pré-visualização progressiva da lematização: as primeiras linhas processadas e uma nuvem provisória feita
+# só com elas são mostradas logo (a resposta ao envio espera por elas no máximo SEGUNDOS_PREVIA) e o
+# resultado completo as substitui quando o job termina.
+LINHAS_PREVIA = int(os.environ.get('TASS_PREVIA_LINHAS', 2000))
+SEGUNDOS_PREVIA = float(os.environ.get('TASS_PREVIA_SEGUNDOS', 1.5))
+
+# A Tokenização roda na própria requisição só para arquivos até este tamanho; acima dele também vira um job,
+# para que arquivos perto do limite de envio não passem do timeout do gunicorn
+LIMITE_TOKENIZACAO_SINCRONA = int(os.environ.get('TASS_TOKENIZACAO_SINCRONA_MB', 64)) * 1024 * 1024
+
+# Rota de upload: o corpo da requisição é gravado em disco aos poucos e só o identificador volta ao navegador
+@server.route('/upload', methods=['POST'])
+def upload_route():
+    with medir('upload') as medicao:
+        try:
+            with medicao.etapa('gravacao'):
+                identificador, tamanho = salvar_stream(flask.request.stream)
+        except UploadInvalido as e:
+            return flask.jsonify(erro=str(e)), 413
+        medicao.tamanho(tamanho_bytes=tamanho)
+    return flask.jsonify(arquivo=identificador, bytes=tamanho)
+
+# Métricas de tempo, tamanho e memória deste worker no formato texto do Prometheus
+@server.route('/metrics')
+def metrics_route():
+    return flask.Response(exportar_metricas(), mimetype='text/plain; version=0.0.4')
 
 # Layout do aplicativo
-app.layout = html.Div(children=[
+layout_base = html.Div(children=[
     # Importação da fonte DIN do Google Fonts
     html.Link(
         rel='stylesheet',
@@ -89,18 +118,24 @@ app.layout = html.Div(children=[
                                     {'label': 'Lematização (processo completo)', 'value': 'clean_text'}],
                                 value='clean_text_2',  # default value
                                 labelStyle={'display': 'block', 'margin': '10px auto', 'fontSize': '20px'})]),                    
-                dcc.Upload(
+                # O arquivo é enviado direto para a rota /upload (assets/upload.js); o callback recebe só o identificador
+                html.Div(
                     id='upload-data',children=html.Div(['Arraste ou ', html.A('selecione um arquivo .TXT')]),
-                    style={'width': '90%', 'maxWidth': '320px', 'height': '60px', 'lineHeight': '60px', 'borderWidth': '1px', 'borderStyle': 'dashed', 'borderRadius': '5px',
-                        'textAlign': 'center', 'margin': '15px auto'},
-                    multiple=False 
+                    style={'cursor': 'pointer', 'width': '90%', 'maxWidth': '320px', 'height': '60px', 'lineHeight': '60px', 'borderWidth': '1px', 'borderStyle': 'dashed', 'borderRadius': '5px',
+                        'textAlign': 'center', 'margin': '15px auto'}
                 ),
+                dcc.Input(id='upload-handle', type='text', style={'display': 'none'}),
                 #---------------------------------------------------- VISUALIZAR PASSO 1-------------------------------------------------------------------------------------
                 html.Div(id='output-upload', style={'display': 'none'}, children=[
                     html.H2(children='Pré-visualizar Lematização do texto', style={'margin': '10px auto','marginLeft': '250px','fontSize': '20px'}),
                     html.Div(id='output-data-upload', style={'margin': '10px auto','marginLeft': '250px','marginRight': '250px','padding': '20px', 'border': '1px solid #ccc'}),
-                    html.Button("Download TXT Lematizado", id="btn_txt", style={'margin': '10px auto', 'marginLeft': '250px','padding': '10px', 'border': '1px solid #ccc'}),
-                    dcc.Download(id="download_txt"),
+                    html.Button("Cancelar processamento", id="btn-cancelar", n_clicks=0, style={'display': 'none'}),
+                    dcc.Interval(id='job-intervalo', interval=1000, disabled=True),
+                    dcc.Store(id='job-id'),
+                    html.A(html.Button("Download TXT Lematizado", id="btn_txt", style={'margin': '10px auto', 'marginLeft': '250px','padding': '10px', 'border': '1px solid #ccc'}),
+                           id='link-txt'),
+                    html.A(html.Button("Download TXT (.gz)", id="btn_txt_gz", style={'margin': '10px', 'padding': '10px', 'border': '1px solid #ccc'}),
+                           id='link-txt-gz'),
                     html.Img(id='wordcloud-image', style={'width': '50%', 'margin': 'auto', 'display': 'block'}),]),
                 #---------------------------------------------------- VISUALIZAR PASSO 2-------------------------------------------------------------------------------------
                 html.H1("Passo 2: Filtrando a nuvem de palavras", style={'margin': '100px auto 20px','textAlign': 'center'}), 
@@ -112,6 +147,19 @@ app.layout = html.Div(children=[
                 dcc.Textarea(id='input-lista', placeholder='Insira sua lista de palavras aqui...', style={'width': '50%', 'height': '100px', 'margin': 'auto', 'display': 'block'}),
                 html.Div(html.Button('Atualizar Nuvem', id='btn-atualizar-nuvem-lista', n_clicks=0, style={'margin': '30px', 'padding': '15px','fontSize': '15px', 'textAlign': 'center'}), style={'text-align': 'center'}),
                 html.Div(id='wordcloud-image-lista', style={'width': '50%', 'margin': 'auto', 'display': 'none'}),  
+                #---------------------------------------------------- PASSO 3-------------------------------------------------------------------------------------
+                html.H1("Passo 3: Expressões frequentes", style={'margin': '100px auto 20px','textAlign': 'center'}), 
+                html.H1(children='Requisito: Finalize a etapa 1', style=text_style), 
+                html.H1('Pares de palavras que aparecem em sequência no texto processado (bigramas), como "atendimento ruim" ou "preço alto". Escolha entre os pares mais frequentes ou as colocações, pares que aparecem juntos mais do que o acaso explicaria (informação mútua pontual, PMI). Ao clicar no botão, ficará visível uma nuvem com os pares e, abaixo dela, os 10 primeiros pares.',
+                    style=text_style),
+                html.Div(style={'display': 'flex','justifyContent': 'center','alignItems': 'center' },
+                        children=[dcc.RadioItems(id='ordenacao-bigramas',options=[
+                                    {'label': 'Pares mais frequentes', 'value': 'frequencia'},
+                                    {'label': 'Colocações (PMI)', 'value': 'pmi'}],
+                                value='frequencia',
+                                labelStyle={'display': 'block', 'margin': '10px auto', 'fontSize': '20px'})]),
+                html.Div(html.Button('Gerar Nuvem de Expressões', id='btn-bigramas', n_clicks=0, style={'margin': '30px', 'padding': '15px','fontSize': '15px', 'textAlign': 'center'}), style={'text-align': 'center'}),
+                html.Div(id='wordcloud-bigramas', style={'width': '50%', 'margin': 'auto', 'display': 'none'}),  
                 html.H1("O TASS Analyzer é uma iniciativa acadêmica para processamento rápido de textos na língua portuguesa.Para mais informações, ou em caso de dúvidas e sugestões, acesse: https://github.com/GabrielaNara/TASS_textanalyzer", 
                         style={'margin': '200px auto', 'textAlign': 'center', 'fontSize': '25px','fontFamily': 'Roboto'}), 
                 html.Hr()
@@ -120,100 +168,324 @@ app.layout = html.Div(children=[
     )
 ])
 
-# Callback para carregar os dados do arquivo CSV e exibir o DataFrame
-@app.callback([Output('output-data-upload', 'children'), Output('wordcloud-image', 'src')],
-              [Input('upload-data', 'contents'), Input('cleaning-function', 'value')],
-              [State('upload-data', 'filename')])
-def update_output(contents, selected_cleaning_function, filename):
-    global tokens_list
+# Cada acesso recebe um identificador de sessão, usado para guardar os resultados no servidor
+def serve_layout():
+    return html.Div([dcc.Store(id='session-id', storage_type='session', data=str(uuid.uuid4())), layout_base])
+
+app.layout = serve_layout
+
+# Publica para a sessão o corpus gravado em disco (vocabulário + ids), visível para todos os workers;
+# as frequências (só as dos termos que entram na nuvem) são calculadas sobre os ids. O modo de limpeza também
+# é guardado, para rotular as métricas.
+# Com a chave (hash do conteúdo enviado), o corpus também fica no cache de resultados do arquivo.
+def salvar_resultado(session_id, corpus, modo, chave=None):
+    if chave:
+        registrar_resultado(chave, modo, corpus)
+    publicar_corpus(session_id, corpus, modo)
+    return corpus.mais_frequentes(TERMOS_NUVEM)
+
+# Repassa as linhas lidas para a lematização e, na mesma leitura do arquivo, preenche o resultado da Tokenização
+def tokenizar_junto(linhas, gravador):
+    tokenizador = Tokenizador()
+    for linha in linhas:
+        gravador.append(tokenizador.separar(linha))
+        yield linha
+
+# Destino dos resultados do job que, além de repassá-los ao gravador, guarda as primeiras linhas e publica a
+# prévia ao chegar a LINHAS_PREVIA linhas ou a um terço do orçamento de tempo (o resto fica para desenhar a nuvem)
+class DestinoComPrevia:
+    def __init__(self, destino, job):
+        self.destino = destino
+        self.job = job
+        self.inicio = time.perf_counter()
+        self.linhas = []
+
+    def append(self, linha):
+        self.destino.append(linha)
+        if self.linhas is None:
+            return
+        self.linhas.append(linha)
+        if len(self.linhas) >= LINHAS_PREVIA or time.perf_counter() - self.inicio >= SEGUNDOS_PREVIA / 3:
+            self.publicar()
+
+    def __len__(self):
+        return len(self.destino)
+
+    def publicar(self):
+        linhas, self.linhas = self.linhas, None
+        frequencias = Counter(termo for linha in linhas for termo in linha.split())
+        self.job.publicar_previa({'linhas': len(linhas), 'tokens': linhas[:8],
+                                  'nuvem': salvar_nuvem(frequencias) if frequencias else None})
+
+# Executado na fila de jobs: lematiza o arquivo enviado e guarda o resultado na sessão.
+# Se a Tokenização deste arquivo ainda não foi calculada, ela é gravada junto e a troca de modo fica instantânea.
+# Devolve o nome da pasta do corpus (o resultado do job é lido do disco pelo worker que mostrar o resultado).
+def lematizar_em_segundo_plano(job, upload_handle, session_id, chave):
+    with medir('update_output', 'clean_text') as medicao:
+        medicao.tamanho(tamanho_bytes=os.path.getsize(caminho_upload(upload_handle)))
+        with medicao.etapa('lematizacao'):
+            linhas = linhas_do_job(upload_handle, job)
+            gravador = novo_gravador()
+            gravador_tokens = novo_gravador() if buscar_resultado(chave, 'clean_text_2') is None else None
+            try:
+                if gravador_tokens is not None:
+                    linhas = tokenizar_junto(linhas, gravador_tokens)
+                _, estatisticas = lematizar_linhas(linhas, destino=DestinoComPrevia(gravador, job))
+            except BaseException:
+                gravador.descartar()
+                if gravador_tokens is not None:
+                    gravador_tokens.descartar()
+                raise
+            corpus = gravador.fechar()
+            if gravador_tokens is not None:
+                corpus_tokens = gravador_tokens.fechar()
+                registrar_resultado(chave, 'clean_text_2', corpus_tokens)
+                agendar_nuvem(corpus_tokens.mais_frequentes(TERMOS_NUVEM))  # desenhada de antemão, para a troca de modo
+        medicao.tamanho(linhas=len(corpus), tokens=corpus.total_tokens)
+        # Um job cancelado (ou substituído por um novo envio ou pela troca de modo) não publica o resultado
+        # por cima do que a sessão já mostra
+        job.verificar_cancelamento()
+        # Com o modelo vazio as palavras não são lematizadas: o resultado é mostrado, mas não vai para o cache
+        # do arquivo, para não ser servido como Lematização quando o modelo voltar
+        degradado = not lematizacao_disponivel()
+        with medicao.etapa('frequencias'):
+            frequencias = salvar_resultado(session_id, corpus, 'clean_text', None if degradado else chave)
+        # A nuvem também é desenhada aqui, fora da requisição: o callback que mostra o resultado
+        # (em qualquer worker) já a encontra pronta no cache de imagens
+        if frequencias:
+            salvar_nuvem(frequencias, medicao)
+    cache = f"cache de lemas: {estatisticas['cache']['taxa_acerto']:.0%} de acertos, " if estatisticas['cache']['ativo'] else ''
+    vazao = (f"{estatisticas['linhas']} linhas lematizadas ({estatisticas['linhas_por_segundo']:.0f} linhas/s, "
+             f"{cache}linhas repetidas: {estatisticas['repetidas']['taxa_repetidas']:.0%})")
+    if degradado:
+        vazao = AVISO_DEGRADADO + '\n' + vazao
+    return {'corpus': os.path.basename(corpus.pasta), 'vazao': vazao, 'modo': 'clean_text'}
+
+# Linhas não vazias do arquivo enviado para a função do job. O progresso é medido em bytes lidos (job.total é o
+# tamanho do arquivo): o job é enviado sem ler o arquivo antes só para contar as linhas, e a leitura é
+# interrompida se ele for cancelado
+def linhas_do_job(upload_handle, job):
+    for linha, posicao in ler_linhas_posicao(upload_handle):
+        job.atualizar(posicao)
+        linha = linha.strip()
+        if linha:
+            yield linha
+
+# Tokenização do arquivo enviado, gravada direto em disco: na requisição ou, com job, na fila de jobs
+def tokenizar_arquivo(upload_handle, session_id, chave, job=None):
+    with medir('update_output', 'clean_text_2') as medicao:
+        with medicao.etapa('tokenizacao'):
+            if job is None:
+                linhas = (line.strip() for line in ler_linhas(upload_handle) if line.strip())
+            else:
+                linhas = linhas_do_job(upload_handle, job)
+            palavras = tokenizar_linhas(linhas)
+            inicio = time.perf_counter()
+            corpus = gravar_linhas(palavras)
+            segundos = time.perf_counter() - inicio
+        medicao.tamanho(tamanho_bytes=os.path.getsize(caminho_upload(upload_handle)),
+                        linhas=len(corpus), tokens=corpus.total_tokens)
+        if job is not None:
+            job.verificar_cancelamento()
+        with medicao.etapa('frequencias'):
+            frequencias = salvar_resultado(session_id, corpus, 'clean_text_2', chave)
+    vazao = f"{len(corpus)} linhas tokenizadas ({len(corpus) / segundos if segundos > 0 else 0:.0f} linhas/s)"
+    return corpus, frequencias, vazao
+
+def tokenizar_em_segundo_plano(job, upload_handle, session_id, chave):
+    corpus, frequencias, vazao = tokenizar_arquivo(upload_handle, session_id, chave, job)
+    if frequencias:
+        salvar_nuvem(frequencias)
+    return {'corpus': os.path.basename(corpus.pasta), 'vazao': vazao, 'modo': 'clean_text_2'}
+
+AVISO_DEGRADADO = ('Atenção: o modelo de português do SpaCy não está disponível no servidor. '
+                   'As palavras foram apenas separadas, sem lematização.')
+
+# Com TASS_LIMITE_TERMOS o corpus guarda só as frequências aproximadas dos termos mais comuns: o aviso mostra
+# o quanto cada frequência (de palavras ou, com n=2, de pares) pode estar abaixo da real
+def aviso_aproximado(corpus, n=1):
+    if not isinstance(corpus, CorpusAproximado):
+        return []
+    erro_maximo = corpus.erro_maximo if n == 1 else corpus.contagens_ngramas(n).erro_maximo
+    return [html.P(f'Contagem aproximada (até {corpus.limite} termos guardados): cada frequência pode estar até '
+                   f'{erro_maximo} abaixo da real.', style={'whiteSpace': 'pre-wrap'})]
+
+# Pré-visualização do texto processado e nuvem de palavras
+def montar_saida(upload_handle, corpus, frequencias, vazao='', modo='nenhum'):
+    # Verificar se há conteúdo válido no arquivo
+    if not corpus:
+        return html.Div([
+            html.H3('Erro: Arquivo vazio.'),
+            html.P('O arquivo carregado não contém texto válido para processamento.')
+        ]), None
 
-    if contents is not None:
+    # Verificar se há tokens após o processamento
+    if not frequencias:
+        return html.Div([
+            html.H3('Não há palavras suficientes para gerar uma nuvem de palavras.'),
+            html.P('Verifique o conteúdo do arquivo e tente novamente.')
+        ]), None
+
+    # Gerar a nuvem de palavras a partir do índice de frequências
+    with medir('montar_saida', modo) as medicao:
+        src = salvar_nuvem(frequencias, medicao)
+
+    # Exibir o processamento do texto
+    table_output = html.Div([
+        html.H3('Processamento do texto completo:'),
+        html.P('Texto original:'),
+        html.Pre(ler_inicio(upload_handle, 1000) + '...', style={'whiteSpace': 'pre-wrap', 'wordBreak': 'break-all'}),
+        html.P('Tokens após processamento:'),
+        html.Pre('\n'.join(corpus[:8]) + '...', style={'whiteSpace': 'pre-wrap', 'wordBreak': 'break-all'}),
+        html.P(vazao, style={'whiteSpace': 'pre-wrap'})
+    ] + aviso_aproximado(corpus))
+
+    # Retornar a exibição do DataFrame e a nuvem de palavras
+    return table_output, src
+
+def mostrar_progresso(job, upload_handle, modo):
+    progresso = [
+        html.H3('Lematização em andamento...' if modo == 'clean_text' else 'Tokenização em andamento...'),
+        html.Progress(value=str(job.processadas), max=str(max(job.total, 1)), style={'width': '100%'}),
+        html.P(f'{job.processadas / 1e6:.1f} de {job.total / 1e6:.1f} MB lidos ({job.progresso():.0%})')
+    ]
+    if modo == 'clean_text' and estado_modelo['estado'] == 'degradado':
+        progresso.append(html.P(AVISO_DEGRADADO))
+    previa = job.previa
+    if previa is None:
+        return html.Div(progresso)
+    return html.Div(progresso + [
+        html.H3(f"Prévia das primeiras {previa['linhas']} linhas (substituída pelo resultado completo ao final):"),
+        html.P('Texto original:'),
+        html.Pre(ler_inicio(upload_handle, 1000) + '...', style={'whiteSpace': 'pre-wrap', 'wordBreak': 'break-all'}),
+        html.P('Tokens após processamento:'),
+        html.Pre('\n'.join(previa['tokens']) + '...', style={'whiteSpace': 'pre-wrap', 'wordBreak': 'break-all'})
+    ])
+
+estilo_cancelar = {'margin': '10px auto', 'marginLeft': '250px', 'padding': '10px', 'border': '1px solid #ccc', 'display': 'block'}
+
+# Saídas de update_output para um job: progresso e prévia (com a nuvem provisória) enquanto ele roda,
+# resultado completo quando termina
+def resposta_job(upload_handle, job, modo):
+    sem_job = (None, True, {'display': 'none'})
+    if not job.finalizado:
+        nuvem = job.previa['nuvem'] if job.previa else None
+        return mostrar_progresso(job, upload_handle, modo), nuvem, job.id, False, estilo_cancelar
+    if job.estado == 'erro':
+        return (html.Div([html.H3('Ocorreu um erro ao processar o arquivo:'), html.P(job.erro)]), None) + sem_job
+    if job.estado == 'cancelado':
+        return (html.Div([html.H3('Processamento cancelado.')]), None) + sem_job
+    try:
+        corpus = abrir_pasta(job.resultado['corpus'])
+        if corpus is None:
+            return (html.Div([html.H3('O resultado expirou. Envie o arquivo novamente.')]), None) + sem_job
+        frequencias = corpus.mais_frequentes(TERMOS_NUVEM)
+        return montar_saida(upload_handle, corpus, frequencias, job.resultado['vazao'], job.resultado['modo']) + sem_job
+    except Exception as e:
+        return (html.Div([html.H3('Ocorreu um erro ao processar o arquivo:'), html.P(str(e))]), None) + sem_job
+
+# Callback para carregar os dados do arquivo TXT e exibir o processamento.
+# A lematização completa (e a tokenização de arquivos grandes) vira um job em segundo plano;
+# o dcc.Interval consulta o progresso (e a prévia) até o fim.
+@app.callback([Output('output-data-upload', 'children'), Output('wordcloud-image', 'src'),
+               Output('job-id', 'data'), Output('job-intervalo', 'disabled'), Output('btn-cancelar', 'style')],
+              [Input('upload-handle', 'value'), Input('cleaning-function', 'value'),
+               Input('job-intervalo', 'n_intervals'), Input('btn-cancelar', 'n_clicks')],
+              [State('session-id', 'data'), State('job-id', 'data')])
+def update_output(upload_handle, selected_cleaning_function, n_intervals, n_cancelar, session_id, job_id):
+    sem_job = (None, True, {'display': 'none'})
+
+    if ctx.triggered_id == 'btn-cancelar':
+        fila_jobs.cancelar(job_id)
+        return (html.Div([html.H3('Processamento cancelado.')]), None) + sem_job
+
+    if ctx.triggered_id == 'job-intervalo':
+        job = fila_jobs.obter(job_id)
+        if job is None:
+            return (html.Div([html.H3('O processamento não foi encontrado. Envie o arquivo novamente.')]), None) + sem_job
+        return resposta_job(upload_handle, job, selected_cleaning_function)
+
+    # Novo arquivo ou troca do tipo de processamento: o job anterior desta sessão não é mais necessário
+    if job_id:
+        fila_jobs.cancelar(job_id)
+
+    if upload_handle:
         try:
-            # Decodificar o conteúdo do arquivo TXT
-            content_type, content_string = contents.split(',')
-            decoded = base64.b64decode(content_string).decode('utf-8')
-
-            # Verificar se há conteúdo válido no arquivo
-            if len(decoded.strip()) == 0:
-                return html.Div([
-                    html.H3('Erro: Arquivo vazio.'),
-                    html.P('O arquivo carregado não contém texto válido para processamento.')
-                ]), None
-            
-            # Selecionar a função de limpeza com base na escolha do usuário
+            # Resultado já calculado para este conteúdo e modo (troca de modo ou o mesmo arquivo enviado de novo):
+            # nada é lido nem processado outra vez
+            chave = hash_upload(upload_handle)
+            corpus = buscar_resultado(chave, selected_cleaning_function)
+            if corpus is not None:
+                frequencias = salvar_resultado(session_id, corpus, selected_cleaning_function)
+                vazao = f"{len(corpus)} linhas (resultado já calculado para este arquivo)"
+                return montar_saida(upload_handle, corpus, frequencias, vazao, selected_cleaning_function) + sem_job
+
             if selected_cleaning_function == 'clean_text':
-                cleaning_function = clean_text
-            else:
-                cleaning_function = clean_text_2
-
-            # Aplicar a função de limpeza selecionada ao conteúdo do arquivo
-            tokens_list = [cleaning_function(line.strip()) for line in decoded.splitlines() if line.strip()]
-
-            # Aplicar a função clean_text ao conteúdo do arquivo
-            # tokens_list = [clean_text(line.strip()) for line in decoded.splitlines() if line.strip()]
-
-            # Verificar se há tokens após o processamento
-            if not tokens_list or all(len(token) == 0 for token in tokens_list):
-                return html.Div([
-                    html.H3('Não há palavras suficientes para gerar uma nuvem de palavras.'),
-                    html.P('Verifique o conteúdo do arquivo e tente novamente.')
-                ]), None
-            
-            # Gerar a nuvem de palavras
-            wordcloud = WordCloud(width=600, height=300, background_color='white').generate(' '.join(tokens_list))
-            img = io.BytesIO()
-            wordcloud.to_image().save(img, format='JPEG', quality=80)
-            img.seek(0)
-            
-            # Exibir o processamento do texto
-            table_output = html.Div([
-                html.H3('Processamento do texto completo:'),
-                html.P('Texto original:'),
-                html.Pre(decoded[:1000] + '...', style={'whiteSpace': 'pre-wrap', 'wordBreak': 'break-all'}),
-                html.P('Tokens após processamento:'),
-                html.Pre('\n'.join(tokens_list[:8]) + '...', style={'whiteSpace': 'pre-wrap', 'wordBreak': 'break-all'})
-            ])
+                # Lematização em lote com nlp.pipe, fora da requisição
+                novo_job = fila_jobs.enviar(session_id, lematizar_em_segundo_plano, upload_handle, session_id, chave,
+                                            total=os.path.getsize(caminho_upload(upload_handle)))
+                # A resposta espera a prévia (ou o fim, para arquivos pequenos) até o orçamento de tempo
+                job = fila_jobs.obter(novo_job)
+                job.aguardar_previa(SEGUNDOS_PREVIA)
+                return resposta_job(upload_handle, job, selected_cleaning_function)
+
+            if os.path.getsize(caminho_upload(upload_handle)) > LIMITE_TOKENIZACAO_SINCRONA:
+                novo_job = fila_jobs.enviar(session_id, tokenizar_em_segundo_plano, upload_handle, session_id, chave,
+                                            total=os.path.getsize(caminho_upload(upload_handle)))
+                job = fila_jobs.obter(novo_job)
+                job.aguardar_previa(SEGUNDOS_PREVIA)
+                return resposta_job(upload_handle, job, selected_cleaning_function)
 
-            # Retornar a exibição do DataFrame e a nuvem de palavras
-            return table_output, 'data:image/jpeg;base64,' + base64.b64encode(img.getvalue()).decode()
+            # Ler o arquivo TXT enviado linha a linha, direto do disco, e aplicar a tokenização
+            corpus, frequencias, vazao = tokenizar_arquivo(upload_handle, session_id, chave)
+            return montar_saida(upload_handle, corpus, frequencias, vazao, 'clean_text_2') + sem_job
 
         except Exception as e:
-            return html.Div([
+            return (html.Div([
                 html.H3('Ocorreu um erro ao processar o arquivo:'),
                 html.P(str(e))
-            ]), None
+            ]), None) + sem_job
     else:
-        return html.Div(['Aguarde o processamento...']), None
+        return (html.Div(['Aguarde o processamento...']), None) + sem_job
 
 # Callback para mostrar a parte do layout após o upload do arquivo
 @app.callback(
     Output('output-upload', 'style'),
-    [Input('upload-data', 'contents')]
+    [Input('upload-handle', 'value')]
 )
-def show_upload_output(contents):
-    if contents is not None:
+def show_upload_output(upload_handle):
+    if upload_handle:
         return {'display': 'block'}
     else:
         return {'display': 'none'}
     
-# Callback para fazer download do arquivo TXT modificado com os novos tokens
+# Links de download do arquivo TXT com os novos tokens (rota /download/tokens.txt da sessão)
 @app.callback(
-    Output("download_txt", "data"),
-    [Input("btn_txt", "n_clicks")])
-def download_txt(n_clicks):
-    global tokens_list
-    
-    if n_clicks is not None and tokens_list:
-        # Criar o conteúdo do arquivo TXT com os novos tokens
-        txt_content = '\n'.join(tokens_list)
-        # Retornar o arquivo TXT como uma resposta para download
-        return dict(content=txt_content, filename="tokens.txt")
+    [Output('link-txt', 'href'), Output('link-txt-gz', 'href')],
+    [Input('session-id', 'data')])
+def links_download(session_id):
+    return f'/download/tokens.txt?sessao={session_id}', f'/download/tokens.txt?sessao={session_id}&gzip=1'
+
+# Gera o conteúdo do TXT aos poucos, decodificando os ids em blocos de linhas direto do corpus em disco
+def gerar_txt(corpus, modo):
+    with medir('download_txt', modo) as medicao:
+        medicao.tamanho(linhas=len(corpus), tokens=corpus.total_tokens)
+        with medicao.etapa('serializacao_envio'):
+            yield from blocos_linhas(corpus)
+
+# Download do arquivo TXT em streaming (opcionalmente comprimido com ?gzip=1)
+@server.route('/download/tokens.txt')
+def download_txt_route():
+    corpus, modo = abrir_corpus(flask.request.args.get('sessao'))
+    if not corpus:
+        flask.abort(404)
+    return resposta_download(gerar_txt(corpus, modo), 'tokens.txt', 'text/plain; charset=utf-8', pediu_gzip())
 
 # MOSTRAR A NUVEM GERAL APENAS SE O CSV É INSERIDO
 @app.callback(Output('wordcloud-image', 'style'),
-              [Input('upload-data', 'contents')])
-def update_image_style(contents):
-    if contents is None:
+              [Input('upload-handle', 'value')])
+def update_image_style(upload_handle):
+    if not upload_handle:
         return {'display': 'none'}  # Ocultar a imagem
     else:
         return {'width': '50%', 'margin': 'auto', 'display': 'block'}  # Mostrar a imagem
@@ -221,38 +493,40 @@ def update_image_style(contents):
 # Callback para atualizar a nuvem de palavras por uma lista
 @app.callback(Output('wordcloud-image-lista', 'children'), 
               [Input('btn-atualizar-nuvem-lista', 'n_clicks')],
-              [State('input-lista', 'value')])
-def update_wordcloud_by_list(n_clicks, lista):
-    global tokens_list
-
-    if tokens_list  and n_clicks > 0 and lista:
-        lista_set = set(lista.split())
-        word_counter = Counter()
-
-        filtered_text = []
-        for tokens_string in tokens_list:
-            tokens = tokens_string.split()
-            filtered_tokens = [token for token in tokens if token in lista_set]
-            word_counter.update(filtered_tokens)
-
-        # Extraindo as palavras únicas que estão na lista original
-        unique_filtered_tokens = [word for word in word_counter if word in lista_set]
-
-        # Obtendo as 10 palavras mais comuns
-        top_10_words = word_counter.most_common(10)
-        top_words_list = [html.Li(f"{word}: {count} vezes", style={'color': 'white'}) for word, count in top_10_words]
-
-        # Construção da tabela com as 10 palavras mais frequentes
-        table_frequencia = html.Div([   html.H3('10 palavras mais frequentes:'),        
-                                     html.Ul(top_words_list)  ])
-
-        # Criar a nuvem de palavras com base no texto filtrado
-        filtered_text = ' '.join(unique_filtered_tokens)
-        wordcloud = WordCloud(width=600, height=300, background_color='white').generate(filtered_text)
-        img = io.BytesIO()
-        wordcloud.to_image().save(img, format='JPEG', quality=80)
-        img.seek(0)
-        wordcloud_image = html.Img(src='data:image/jpeg;base64,' + base64.b64encode(img.getvalue()).decode(), style={'width': '100%', 'margin': 'auto', 'display': 'block'})
+              [State('input-lista', 'value'), State('session-id', 'data')])
+def update_wordcloud_by_list(n_clicks, lista, session_id):
+    corpus, modo = abrir_corpus(session_id)
+
+    if corpus  and n_clicks > 0 and lista:
+        with medir('update_wordcloud_by_list', modo) as medicao:
+            lista_set = set(lista.split())
+            medicao.tamanho(tamanho_bytes=len(lista.encode('utf-8')), tokens=len(lista_set))
+
+            # Consultar as frequências pelos ids dos termos da lista
+            with medicao.etapa('filtro'):
+                word_counter = corpus.filtrar(lista_set)
+
+            if not word_counter:
+                if isinstance(word_counter, ContagemAproximada) and word_counter.erro_maximo:
+                    return html.Div([html.H3('Nenhuma palavra da lista está entre as mais frequentes do texto processado '
+                                             f'(cada uma aparece no máximo {word_counter.erro_maximo} vezes).')])
+                return html.Div([html.H3('Nenhuma palavra da lista aparece no texto processado.')])
+
+            # Obtendo as 10 palavras mais comuns (na contagem aproximada, com a faixa da frequência real)
+            top_10_words = word_counter.most_common(10)
+            if isinstance(word_counter, ContagemAproximada):
+                top_words_list = [html.Li("{}: entre {} e {} vezes".format(word, *word_counter.intervalo(word)), style={'color': 'white'})
+                                  for word, count in top_10_words]
+            else:
+                top_words_list = [html.Li(f"{word}: {count} vezes", style={'color': 'white'}) for word, count in top_10_words]
+
+            # Construção da tabela com as 10 palavras mais frequentes
+            table_frequencia = html.Div([   html.H3('10 palavras mais frequentes:'),        
+                                         html.Ul(top_words_list)  ] + aviso_aproximado(corpus))
+
+            # Criar a nuvem de palavras com base nas frequências filtradas
+            src = salvar_nuvem(word_counter, medicao)
+            wordcloud_image = html.Img(src=src, style={'width': '100%', 'margin': 'auto', 'display': 'block'})
         
         return [wordcloud_image,table_frequencia ]
     else:
@@ -268,6 +542,44 @@ def update_image_style(n_clicks):
     else:
         return {'display': 'none'}  # Ocultar a imagem
 
+# Callback da nuvem de bigramas: as contagens saem dos ids do corpus da sessão (Tass_corpus.contagens_ngramas),
+# calculadas uma vez por corpus e reaproveitadas entre as duas ordenações
+@app.callback(Output('wordcloud-bigramas', 'children'),
+              [Input('btn-bigramas', 'n_clicks')],
+              [State('ordenacao-bigramas', 'value'), State('session-id', 'data')])
+def update_bigramas(n_clicks, ordenacao, session_id):
+    corpus, modo = abrir_corpus(session_id)
+    if not corpus or n_clicks == 0:
+        return html.Div([html.H3('Processe um arquivo no passo 1 para ver as expressões frequentes.')])
+
+    with medir('update_bigramas', modo) as medicao:
+        with medicao.etapa('ngramas'):
+            if ordenacao == 'pmi':
+                contagens, pmi = corpus.colocacoes(TERMOS_NUVEM)
+            else:
+                contagens, pmi = corpus.ngramas_frequentes(TERMOS_NUVEM), None
+        if not contagens:
+            return html.Div([html.H3('Não há pares de palavras suficientes no texto processado.')])
+        src = salvar_nuvem(contagens, medicao)
+
+    # Os 10 primeiros pares: por frequência, ou na ordem do PMI
+    primeiros = list(pmi.items())[:10] if pmi is not None else contagens.most_common(10)
+    if pmi is not None:
+        itens = [html.Li(f"{par}: {contagens[par]} vezes (PMI {valor:.2f})", style={'color': 'white'}) for par, valor in primeiros]
+    else:
+        itens = [html.Li(f"{par}: {contagem} vezes", style={'color': 'white'}) for par, contagem in primeiros]
+    return [html.Img(src=src, style={'width': '100%', 'margin': 'auto', 'display': 'block'}),
+            html.Div([html.H3('10 primeiros pares:'), html.Ul(itens)] + aviso_aproximado(corpus, 2))]
+
+# MOSTRAR A NUVEM DE BIGRAMAS APENAS SE O BOTÃO É CLICADO
+@app.callback(Output('wordcloud-bigramas', 'style'),
+              [Input('btn-bigramas', 'n_clicks')])
+def update_bigramas_style(n_clicks):
+    if n_clicks > 0:
+        return {'width': '50%', 'margin': 'auto', 'display': 'block'}
+    else:
+        return {'display': 'none'}
+
 # Executar o aplicativo
 if __name__ == '__main__':
     app.run_server(debug=True)
\ No newline at end of file
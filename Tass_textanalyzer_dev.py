@@ -2,16 +2,18 @@ import dash
 from dash import dcc, html, dash_table
 from dash.dependencies import Input, Output, State
 import pandas as pd
+import numpy as np
 import base64
 import io
 import re
-from wordcloud import WordCloud
-from collections import Counter
-            
-# Variável global para armazenar os dados do arquivo CSV
-data = None
-tokens_text = "" 
-nlp = spacy.load("pt_core_news_sm", exclude=["ner"]) 
+import uuid
+import flask
+from Tass_sessoes import armazem
+from Tass_corpus import CorpusCodificado
+from Tass_nuvem import TERMOS_NUVEM
+from Tass_imagens import salvar_nuvem, registrar_rota as registrar_rota_nuvens
+from Tass_downloads import blocos_csv, com_tokens, resposta_download, pediu_gzip
+from Tass_planilhas import ler_lotes_xlsx
 
 # Estilos utilizados
 page_style = {'backgroundImage': 'url("https://img.freepik.com/fotos-gratis/fundo-preto-abstrato-da-grade-digital_53876-97647.jpg")', 
@@ -23,18 +25,42 @@ page_style = {'backgroundImage': 'url("https://img.freepik.com/fotos-gratis/fund
             'color': 'white'}
 text_style = {'margin': '10px auto','textAlign': 'center', 'fontSize': '15px','fontFamily': 'Roboto'}
 
+# Palavras removidas na limpeza (também usadas pelo filtro vetorizado com isin)
+stopwords_list = ['a', 'à', 'ao', 'aos', 'aquela', 'aquelas', 'aquele', 'aquele#s', 'aquilo', 'as', 'às', 'até', 'com', 'como', 'da', 'das', 'de', 'dela', 'delas', 'dele', 'deles', 'depois', 'do', 'dos', 'e', 'é', 'ela', 'elas', 'ele', 'eles', 'em', 'entre', 'era', 'eram', 'éramos', 'essa', 'essas', 'esse', 'esses', 'esta', 'está', 'estamos', 'estão', 'estar', 'estas', 'estava', 'estavam', 'estávamos', 'este', 'esteja', 'estejam', 'estejamos', 'estes', 'esteve', 'estive', 'estivemos', 'estiver', 'estivera', 'estiveram', 'estivéramos', 'estiverem', 'estivermos', 'estivesse', 'estivessem', 'estivéssemos', 'estou', 'eu', 'foi', 'fomos', 'for', 'fora', 'foram', 'fôramos', 'forem', 'formos', 'fosse', 'fossem', 'fôssemos', 'fui', 'há', 'haja', 'hajam', 'hajamos', 'hão', 'havemos', 'haver', 'hei', 'houve', 'houvemos', 'houver', 'houvera', 'houverá', 'houveram', 'houvéramos', 'houverão', 'houverei', 'houverem', 'houveremos', 'houveria', 'houveriam', 'houveríamos', 'houvermos', 'houvesse', 'houvessem', 'houvéssemos', 'isso', 'isto', 'já', 'lhe', 'lhes', 'mais', 'mas', 'me', 'mesmo', 'meu', 'meus', 'minha', 'minhas', 'muito', 'na', 'não', 'nas', 'nem', 'no', 'nos', 'nós', 'nossa', 'nossas', 'nosso', 'nossos', 'num', 'numa', 'o', 'os', 'ou', 'para', 'pela', 'pelas', 'pelo', 'pelos', 'por', 'qual', 'quando', 'que', 'quem', 'são', 'se', 'seja', 'sejam', 'sejamos', 'sem', 'ser', 'será', 'serão', 'serei', 'seremos', 'seria', 'seriam', 'seríamos', 'seu', 'seus', 'só', 'somos', 'sou', 'sua', 'suas', 'também', 'te', 'tem', 'tém', 'temos', 'tenha', 'tenham', 'tenhamos', 'tenho', 'terá', 'terão', 'terei', 'teremos', 'teria', 'teriam', 'teríamos', 'teu', 'teus', 'teve', 'tinha', 'tinham', 'tínhamos', 'tive', 'tivemos', 'tiver', 'tivera', 'tiveram', 'tivéramos', 'tiverem', 'tivermos', 'tivesse', 'tivessem', 'tivéssemos', 'tu', 'tua', 'tuas', 'um', 'uma', 'você', 'vocês', 'vos', "'", 'pra', 'eh', 'vcs', 'lá', 'né', 'q', 'o', 'tá', 'co', 't', 's', 'rt', 'pq', 'ta', 'tô', 'ihh', 'ih', 'otc', 'vc', 'https', 'n', 'pois', 'porque']
+
+# Expressão das palavras, compartilhada por clean_text e pela versão vetorizada
+padrao_palavras = r'\b[A-zÀ-úü]+\b'
+
 def clean_text(text):
-    stopwords_list = ['a', 'à', 'ao', 'aos', 'aquela', 'aquelas', 'aquele', 'aquele#s', 'aquilo', 'as', 'às', 'até', 'com', 'como', 'da', 'das', 'de', 'dela', 'delas', 'dele', 'deles', 'depois', 'do', 'dos', 'e', 'é', 'ela', 'elas', 'ele', 'eles', 'em', 'entre', 'era', 'eram', 'éramos', 'essa', 'essas', 'esse', 'esses', 'esta', 'está', 'estamos', 'estão', 'estar', 'estas', 'estava', 'estavam', 'estávamos', 'este', 'esteja', 'estejam', 'estejamos', 'estes', 'esteve', 'estive', 'estivemos', 'estiver', 'estivera', 'estiveram', 'estivéramos', 'estiverem', 'estivermos', 'estivesse', 'estivessem', 'estivéssemos', 'estou', 'eu', 'foi', 'fomos', 'for', 'fora', 'foram', 'fôramos', 'forem', 'formos', 'fosse', 'fossem', 'fôssemos', 'fui', 'há', 'haja', 'hajam', 'hajamos', 'hão', 'havemos', 'haver', 'hei', 'houve', 'houvemos', 'houver', 'houvera', 'houverá', 'houveram', 'houvéramos', 'houverão', 'houverei', 'houverem', 'houveremos', 'houveria', 'houveriam', 'houveríamos', 'houvermos', 'houvesse', 'houvessem', 'houvéssemos', 'isso', 'isto', 'já', 'lhe', 'lhes', 'mais', 'mas', 'me', 'mesmo', 'meu', 'meus', 'minha', 'minhas', 'muito', 'na', 'não', 'nas', 'nem', 'no', 'nos', 'nós', 'nossa', 'nossas', 'nosso', 'nossos', 'num', 'numa', 'o', 'os', 'ou', 'para', 'pela', 'pelas', 'pelo', 'pelos', 'por', 'qual', 'quando', 'que', 'quem', 'são', 'se', 'seja', 'sejam', 'sejamos', 'sem', 'ser', 'será', 'serão', 'serei', 'seremos', 'seria', 'seriam', 'seríamos', 'seu', 'seus', 'só', 'somos', 'sou', 'sua', 'suas', 'também', 'te', 'tem', 'tém', 'temos', 'tenha', 'tenham', 'tenhamos', 'tenho', 'terá', 'terão', 'terei', 'teremos', 'teria', 'teriam', 'teríamos', 'teu', 'teus', 'teve', 'tinha', 'tinham', 'tínhamos', 'tive', 'tivemos', 'tiver', 'tivera', 'tiveram', 'tivéramos', 'tiverem', 'tivermos', 'tivesse', 'tivessem', 'tivéssemos', 'tu', 'tua', 'tuas', 'um', 'uma', 'você', 'vocês', 'vos', "'", 'pra', 'eh', 'vcs', 'lá', 'né', 'q', 'o', 'tá', 'co', 't', 's', 'rt', 'pq', 'ta', 'tô', 'ihh', 'ih', 'otc', 'vc', 'https', 'n', 'pois', 'porque']
-    letters = re.findall(r'\b[A-zÀ-úü]+\b', text.lower())
+    letters = re.findall(padrao_palavras, text.lower())
     filtered_words = [word for word in letters if word not in stopwords_list]
     return filtered_words
 
+# Versão vetorizada de clean_text para a coluna inteira: str.lower/str.findall, explode e isin, sem chamadas
+# Python por linha. Devolve o corpus codificado (frequências via bincount), uma linha por linha da coluna; a coluna
+# 'tokens' (palavras unidas por SEPARADOR_TOKENS) sai dele com linhas_unidas. Se um corpus for informado, as linhas
+# são acrescentadas a ele (leitura do arquivo em lotes).
+SEPARADOR_TOKENS = ', '  # palavras na coluna tokens, como em clean_text
+
+def limpar_coluna(textos, corpus=None):
+    textos = textos.fillna('').astype(str).reset_index(drop=True)
+    palavras = textos.str.lower().str.findall(padrao_palavras).explode().dropna()
+    palavras = palavras[~palavras.isin(stopwords_list)]
+
+    # Corpus codificado: ids pelo factorize e início de cada linha pela contagem de palavras por linha
+    ids, vocabulario = pd.factorize(palavras)
+    tamanhos = np.bincount(palavras.index.to_numpy(dtype=np.int64), minlength=len(textos))
+    offsets = np.concatenate(([0], np.cumsum(tamanhos)))
+    corpus = corpus if corpus is not None else CorpusCodificado()
+    return corpus.estender_ids(vocabulario, ids, offsets)
+
 # Criar o aplicativo Dash
 app = dash.Dash(__name__)
 server = app.server
+registrar_rota_nuvens(server)  # /nuvem/<chave>: imagens das nuvens de palavras (ver Tass_imagens)
 
 # Layout do aplicativo
-app.layout = html.Div(children=[
+layout_base = html.Div(children=[
     # Importação da fonte DIN do Google Fonts
     html.Link(
         rel='stylesheet',
@@ -63,8 +89,10 @@ app.layout = html.Div(children=[
                 html.Div(id='output-upload', style={'display': 'none'}, children=[
                     html.H2(children='Pré-visualizar Lematização do texto', style={'margin': '10px auto','marginLeft': '250px','fontSize': '20px'}),
                     html.Div(id='output-data-upload', style={'margin': '10px auto','marginLeft': '250px','marginRight': '250px','padding': '20px', 'border': '1px solid #ccc'}),
-                    html.Button("Download CSV", id="btn_csv", style={'margin': '10px auto', 'marginLeft': '250px','padding': '10px', 'border': '1px solid #ccc'}),
-                    dcc.Download(id="download_csv"),
+                    html.A(html.Button("Download CSV", id="btn_csv", style={'margin': '10px auto', 'marginLeft': '250px','padding': '10px', 'border': '1px solid #ccc'}),
+                           id='link-csv'),
+                    html.A(html.Button("Download CSV (.gz)", id="btn_csv_gz", style={'margin': '10px', 'padding': '10px', 'border': '1px solid #ccc'}),
+                           id='link-csv-gz'),
                     html.Img(id='wordcloud-image', style={'width': '50%', 'margin': 'auto', 'display': 'block'}),]),
                 #---------------------------------------------------- VISUALIZAR PASSO 2-------------------------------------------------------------------------------------
                 html.H1("Passo 2: Filtrando a nuvem de palavras", style={'margin': '20px auto','textAlign': 'center'}), 
@@ -82,49 +110,59 @@ app.layout = html.Div(children=[
     )
 ])
 
+# Cada acesso recebe um identificador de sessão, usado para guardar os resultados no servidor
+def serve_layout():
+    return html.Div([dcc.Store(id='session-id', storage_type='session', data=str(uuid.uuid4())), layout_base])
+
+app.layout = serve_layout
+
 # Callback para carregar os dados do arquivo CSV
 def load_data(contents):
-    global data
     content_type, content_string = contents.split(',')
     decoded = base64.b64decode(content_string).decode('utf-8')
-    data = pd.read_csv(io.StringIO(decoded))
+    return pd.read_csv(io.StringIO(decoded))
 
 # Callback para carregar o arquivo e exibir o DataFrame
 @app.callback([Output('output-data-upload', 'children'), Output('wordcloud-image', 'src')],
               [Input('upload-data', 'contents')],
-              [State('upload-data', 'filename')])
-def update_output(contents, filename):
-    global data  
-    global tokens_text  
+              [State('upload-data', 'filename'), State('session-id', 'data')])
+def update_output(contents, filename, session_id):
 
     if contents is not None:
-        # Ler o conteúdo do arquivo
-        content_type, content_string = contents.split(',')
-        decoded = base64.b64decode(content_string)
-        
-        # Carregar os dados e organizando o dataframe
-        data = pd.read_excel(io.BytesIO(decoded))
-        # Criando a coluna tokens 
-        strg = []
-        for i in data['text']:
-            words = clean_text(i)
-            strg += [", ".join(words)]
-        data['tokens'] = strg
-        data = data[['text', 'tokens']]
-
-        # Gerar a nuvem de palavras
-        tokens_text = ' '.join(data['tokens'])
-        wordcloud = WordCloud(width=600, height=300, background_color='white').generate(tokens_text)
-        img = io.BytesIO()
-        wordcloud.to_image().save(img, format='PNG')
-        img.seek(0)
+        try:
+            # Ler o conteúdo do arquivo
+            content_type, content_string = contents.split(',')
+            decoded = base64.b64decode(content_string)
+
+            # Ler só a coluna text, em lotes, e limpar cada lote assim que ele é lido (processamento vetorizado
+            # do lote inteiro; o corpus codificado vai sendo estendido). A sessão guarda só o texto e o corpus:
+            # a coluna tokens é refeita na prévia e no download
+            corpus = CorpusCodificado()
+            partes = []
+            for lote in ler_lotes_xlsx(io.BytesIO(decoded)):
+                corpus = limpar_coluna(lote, corpus)
+                partes.append(pd.DataFrame({'text': lote.to_numpy()}))
+            data = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=['text'])
+
+        except Exception as e: # Tratamento genérico de erros (ex.: arquivo sem a coluna text)
+            return html.Div([
+                html.H3('Ocorreu um erro ao processar o arquivo:'),
+                html.P(str(e))
+            ]), None
+
+        armazem.salvar(session_id, 'data', data)
+        armazem.salvar(session_id, 'corpus', corpus)
+
+        # Gerar a nuvem de palavras a partir das frequências do corpus codificado
+        src = salvar_nuvem(corpus.mais_frequentes(TERMOS_NUVEM))
         
         # Exibir as 2 primeiras linhas do DataFrame em uma tabela HTML dentro de um quadro
+        previa = com_tokens(data.iloc[:2], 0, corpus, SEPARADOR_TOKENS)
         table_output = html.Div([
             html.H3('2 primeiras linhas do arquivo de saída:'),
             dash_table.DataTable(
-                columns=[{"name": i, "id": i} for i in data.columns],
-                data=data.to_dict('records')[:2],
+                columns=[{"name": i, "id": i} for i in previa.columns],
+                data=previa.to_dict('records'),
                 style_table={'width': '100%', 'maxWidth': '1500px', 'margin': 'auto'},  
                 style_cell={'textOverflow': 'ellipsis', 'textAlign': 'left', 'color': 'black'},
                 style_data={'whiteSpace': 'normal', 'height': 'auto'}
@@ -132,7 +170,7 @@ def update_output(contents, filename):
         ])
         
         # Retornar a exibição do DataFrame e a nuvem de palavras
-        return table_output, 'data:image/png;base64,' + base64.b64encode(img.getvalue()).decode()
+        return table_output, src
     else:
         return None, None
 
@@ -147,34 +185,23 @@ def show_upload_output(contents):
     else:
         return {'display': 'none'}
     
-# Callback para fazer download do arquivo CSV modificado
+# Links de download do arquivo CSV modificado (rota /download_csv da sessão)
 @app.callback(
-    Output("download_csv", "data"),
-    [Input("btn_csv", "n_clicks")]
+    [Output('link-csv', 'href'), Output('link-csv-gz', 'href')],
+    [Input('session-id', 'data')]
 )
-def download_csv(n_clicks):
-    global data  # Use a variável global 'data'
-    if n_clicks is not None and data is not None:
-        # Crie um buffer de memória para armazenar o CSV
-        buffer = io.StringIO()
-        # Salve o DataFrame no buffer como um arquivo CSV
-        data.to_csv(buffer, index=False, encoding="utf-8", sep=";")
-        # Volte para o início do buffer
-        buffer.seek(0)
-        # Retorne o arquivo CSV como uma resposta para download
-        return dict(content=buffer.getvalue(), filename="tabela.csv")
-
-# Rota para baixar o arquivo CSV
+def links_download(session_id):
+    return f'/download_csv?sessao={session_id}', f'/download_csv?sessao={session_id}&gzip=1'
+
+# Rota para baixar o arquivo CSV: a tabela é convertida e enviada em blocos (opcionalmente comprimida com ?gzip=1)
 @app.server.route("/download_csv")
 def download_csv_route():
-    # Chame a função de callback para obter os dados do CSV
-    csv_data = download_csv(1)["content"]
-    return flask.send_file(
-        io.BytesIO(csv_data.encode("utf-8")),
-        mimetype="text/csv",
-        attachment_filename="tabela.csv",
-        as_attachment=True
-    )
+    sessao = flask.request.args.get('sessao')
+    data, corpus = armazem.obter(sessao, 'data'), armazem.obter(sessao, 'corpus')
+    if data is None or corpus is None:
+        flask.abort(404)
+    return resposta_download(blocos_csv(data, corpus=corpus, separador_tokens=SEPARADOR_TOKENS), 'tabela.csv',
+                             'text/csv; charset=utf-8', pediu_gzip())
 
 # MOSTRAR A NUVEM GERAL APENAS SE O CSV É INSERIDO
 @app.callback(Output('wordcloud-image', 'style'),
@@ -188,17 +215,16 @@ def update_image_style(contents):
 # Callback para atualizar a nuvem de palavras por uma lista
 @app.callback(Output('wordcloud-image-lista', 'children'), 
               [Input('btn-atualizar-nuvem-lista', 'n_clicks')],
-              [State('input-lista', 'value')])
-def update_wordcloud_by_list(n_clicks, lista):
-    global tokens_text  
+              [State('input-lista', 'value'), State('session-id', 'data')])
+def update_wordcloud_by_list(n_clicks, lista, session_id):
+    corpus = armazem.obter(session_id, 'corpus')
 
-    if tokens_text and n_clicks > 0 and lista:
-        # Obter palavras da lista e filtrar texto
+    if corpus and n_clicks > 0 and lista:
+        # Obter palavras da lista e consultar as frequências pelos ids do corpus
         words = clean_text(lista)
-        filtered_text = ' '.join([word for word in clean_text(tokens_text) if word in words])
-
-        # Contagem das palavras no texto filtrado
-        word_counts = Counter(filtered_text.split())
+        word_counts = corpus.filtrar(words)
+        if not word_counts:
+            return html.Div([html.H3('Nenhuma palavra da lista aparece nos tokens.')])
         top_10_words = word_counts.most_common(10)
         top_words_list = [html.Li(f"{word}: {count} vezes", style={'color': 'white'}) for word, count in top_10_words]
         
@@ -208,12 +234,8 @@ def update_wordcloud_by_list(n_clicks, lista):
             html.Ul(top_words_list)
         ])
 
-        # Criar a nuvem de palavras com base no texto filtrado
-        wordcloud = WordCloud(width=600, height=300, background_color='white').generate(filtered_text)
-        img = io.BytesIO()
-        wordcloud.to_image().save(img, format='PNG')
-        img.seek(0)
-        wordcloud_image = html.Img(src='data:image/png;base64,' + base64.b64encode(img.getvalue()).decode(), style={'width': '100%', 'margin': 'auto', 'display': 'block'})
+        # Criar a nuvem de palavras com base nas frequências filtradas
+        wordcloud_image = html.Img(src=salvar_nuvem(word_counts), style={'width': '100%', 'margin': 'auto', 'display': 'block'})
         
         return [wordcloud_image,table_frequencia ]
     else:
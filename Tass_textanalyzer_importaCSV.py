@@ -2,13 +2,23 @@ import dash
 from dash import dcc, html, dash_table
 from dash.dependencies import Input, Output, State
 import pandas as pd
+import numpy as np
 import base64
 import io
-from wordcloud import WordCloud
-from collections import Counter
+import uuid
+import flask
 import spacy
 import spacy.cli
 import concurrent.futures
+import atexit
+import os
+from collections import deque
+from Tass_sessoes import armazem
+from Tass_corpus import CorpusCodificado
+from Tass_nuvem import TERMOS_NUVEM
+from Tass_imagens import salvar_nuvem, registrar_rota as registrar_rota_nuvens
+from Tass_downloads import blocos_csv, com_tokens, resposta_download, pediu_gzip
+from Tass_planilhas import ler_lotes_csv
 
 #ADICIONAR NA LISTA DE REQUIRMENTS pandas==2.2.1
 
@@ -19,12 +29,13 @@ def load_spacy_model(model_name="pt_core_news_sm"):
         spacy.cli.download(model_name)
         return spacy.load(model_name, exclude=["ner", "parser", "attribute_ruler", "tagger"])
 
-# Carregar o modelo SpaCy uma vez
-nlp = load_spacy_model()
+# O modelo SpaCy é carregado uma única vez em cada processo do pool (ver iniciar_worker)
+nlp = None
 
-# Variável global para armazenar os dados do arquivo CSV
-data = None
-tokens_list = ""
+# Pool de processos persistente, reaproveitado entre os uploads
+N_WORKERS = int(os.environ.get('TASS_WORKERS', min(4, os.cpu_count() or 1)))
+CHUNKSIZE = int(os.environ.get('TASS_CHUNKSIZE', 500))
+executor = None
 
 # Estilos utilizados
 page_style = {'backgroundImage': 'url("https://img.freepik.com/fotos-gratis/fundo-preto-abstrato-da-grade-digital_53876-97647.jpg")', 
@@ -44,17 +55,85 @@ stopwords_set = {'a', 'à', 'ao', 'aos', 'aquela', 'aquelas', 'aquele', 'aquele#
 'também', 'te', 'tem', 'tém', 'teu', 'teus',  'tu', 'tua', 'tuas', 'um', 'uma', 'você', 'vocês', 'vos', "'", 'pra', 'eh', 'vcs', 'lá', 'né', 'q', 'o', 'tá', 'co', 't', 's', 'rt', 'pq', 
 'ta', 'tô', 'ihh', 'ih', 'otc', 'vc', 'https', 'n', 'pois', 'porque'}
 
-def clean_text(text):
-    doc = nlp(text.lower())
+def filtrar_doc(doc):
     filtered_words = [token.lemma_ for token in doc if token.is_alpha and token.pos_ in ['ADJ', 'NOUN'] and token.text.lower() not in stopwords_set]
     return ' '.join(filtered_words)
 
+# Executado uma vez em cada processo do pool: carrega o modelo e mantém o worker aquecido
+def iniciar_worker():
+    global nlp
+    nlp = load_spacy_model()
+
+# Executado no worker: limpa um bloco inteiro de linhas (já em minúsculas) com nlp.pipe
+def limpar_bloco(textos):
+    return [filtrar_doc(doc) for doc in nlp.pipe(textos)]
+
+def obter_executor():
+    global executor
+    if executor is None:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=N_WORKERS, initializer=iniciar_worker)
+    return executor
+
+def encerrar_executor():
+    global executor
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+        executor = None
+
+# Encerrar o pool junto com o processo (inclusive quando o gunicorn finaliza o worker)
+atexit.register(encerrar_executor)
+
+# Preparação vetorizada da coluna (valores vazios e minúsculas) antes de enviar aos workers
+def preparar_textos(textos):
+    return textos.fillna('').astype(str).str.lower()
+
+# Envia os blocos de cada lote ao pool assim que o lote é lido, para a leitura do arquivo e a lematização
+# andarem juntas; devolve os resultados lote a lote, na ordem das linhas.
+# Linhas repetidas no lote (retweets) vão ao pool uma vez só: factorize dá os textos diferentes e, para cada linha,
+# a posição do seu texto, usada para repetir o resultado em todas as ocorrências.
+def limpar_lotes(lotes):
+    executor = obter_executor()
+    pendentes = deque()
+    try:
+        for lote in lotes:
+            codigos, unicos = pd.factorize(preparar_textos(lote))
+            futuros = [executor.submit(limpar_bloco, unicos[i:i + CHUNKSIZE].tolist())
+                       for i in range(0, len(unicos), CHUNKSIZE)]
+            pendentes.append((codigos, futuros))
+            while pendentes and all(futuro.done() for futuro in pendentes[0][1]):
+                yield expandir_resultados(*pendentes.popleft())
+        while pendentes:
+            yield expandir_resultados(*pendentes.popleft())
+    except concurrent.futures.process.BrokenProcessPool:
+        # Um worker morreu (ex.: falta de memória): recriar o pool na próxima chamada
+        encerrar_executor()
+        raise
+    finally:
+        for _, futuros in pendentes:
+            for futuro in futuros:
+                futuro.cancel()
+
+def expandir_resultados(codigos, futuros):
+    resultados = [tokens for futuro in futuros for tokens in futuro.result()]
+    return [resultados[codigo] for codigo in codigos.tolist()]
+
+# Corpus codificado a partir da coluna tokens, sem laço Python por linha:
+# str.split/explode separam os tokens, factorize dá os ids e bincount o início de cada linha
+def codificar_tokens(tokens):
+    tokens = tokens.reset_index(drop=True)
+    palavras = tokens.str.split().explode().dropna()
+    ids, vocabulario = pd.factorize(palavras)
+    tamanhos = np.bincount(palavras.index.to_numpy(dtype=np.int64), minlength=len(tokens))
+    offsets = np.concatenate(([0], np.cumsum(tamanhos)))
+    return CorpusCodificado.de_ids(vocabulario, ids, offsets)
+
 # Criar o aplicativo Dash
 app = dash.Dash(__name__)
 server = app.server
+registrar_rota_nuvens(server)  # /nuvem/<chave>: imagens das nuvens de palavras (ver Tass_imagens)
 
 # Layout do aplicativo
-app.layout = html.Div(children=[
+layout_base = html.Div(children=[
     # Importação da fonte DIN do Google Fonts
     html.Link(
         rel='stylesheet',
@@ -84,8 +163,10 @@ app.layout = html.Div(children=[
                     html.H2(children='Processando... aguarde', style={'margin': '10px auto','marginLeft': '250px','fontSize': '20px'}),
                     html.H2(children='Pré-visualizar Lematização do texto', style={'margin': '10px auto','marginLeft': '250px','fontSize': '20px'}),
                     html.Div(id='output-data-upload', style={'margin': '10px auto','marginLeft': '250px','marginRight': '250px','padding': '20px', 'border': '1px solid #ccc'}),
-                    html.Button("Download CSV", id="btn_csv", style={'margin': '10px auto', 'marginLeft': '250px','padding': '10px', 'border': '1px solid #ccc'}),
-                    dcc.Download(id="download_csv"),
+                    html.A(html.Button("Download CSV", id="btn_csv", style={'margin': '10px auto', 'marginLeft': '250px','padding': '10px', 'border': '1px solid #ccc'}),
+                           id='link-csv'),
+                    html.A(html.Button("Download CSV (.gz)", id="btn_csv_gz", style={'margin': '10px', 'padding': '10px', 'border': '1px solid #ccc'}),
+                           id='link-csv-gz'),
                     html.Img(id='wordcloud-image', style={'width': '50%', 'margin': 'auto', 'display': 'block'}),]),
                 #---------------------------------------------------- VISUALIZAR PASSO 2-------------------------------------------------------------------------------------
                 html.H1("Passo 2: Filtrando a nuvem de palavras", style={'margin': '20px auto','textAlign': 'center'}), 
@@ -103,19 +184,34 @@ app.layout = html.Div(children=[
     )
 ])
 
+# Cada acesso recebe um identificador de sessão, usado para guardar os resultados no servidor
+def serve_layout():
+    return html.Div([dcc.Store(id='session-id', storage_type='session', data=str(uuid.uuid4())), layout_base])
+
+app.layout = serve_layout
+
 # Callback para carregar os dados do arquivo CSV e exibir o DataFrame
 @app.callback([Output('output-data-upload', 'children'), Output('wordcloud-image', 'src')],
               [Input('upload-data', 'contents')],
-              [State('upload-data', 'filename')])
-def update_output(contents, filename):
-    global data  
-    global tokens_list
-
+              [State('upload-data', 'filename'), State('session-id', 'data')])
+def update_output(contents, filename, session_id):
     if contents is not None:
         try:
             content_type, content_string = contents.split(',')
             decoded = base64.b64decode(content_string)
-            data = pd.read_csv(io.StringIO(decoded.decode('utf-8')))
+
+            # Ler só a coluna text, em lotes; cada lote vai para o pool persistente assim que é lido
+            # (a ordem das linhas é mantida)
+            lotes_texto = []
+            def guardar_lotes(lotes):
+                for lote in lotes:
+                    lotes_texto.append(lote)
+                    yield lote
+            tokens = [tokens for bloco in limpar_lotes(guardar_lotes(ler_lotes_csv(io.BytesIO(decoded)))) for tokens in bloco]
+            textos = pd.concat(lotes_texto, ignore_index=True) if lotes_texto else pd.Series([], dtype=object)
+            corpus = codificar_tokens(pd.Series(tokens, dtype=object))
+            # A sessão guarda só o texto e o corpus: a coluna tokens é refeita na prévia e no download
+            data = pd.DataFrame({'text': textos})
 
         except Exception as e: # Tratamento genérico de erros    
             return html.Div([
@@ -123,23 +219,19 @@ def update_output(contents, filename):
                 html.P(str(e))
             ]), None
 
-        # Process data in parallel using concurrent.futures
-        with concurrent.futures.ProcessPoolExecutor() as executor:
-                tokens_list = list(executor.map(clean_text, data['text']))
-        data['tokens'] = tokens_list
+        armazem.salvar(session_id, 'data', data)
+        armazem.salvar(session_id, 'corpus', corpus)
 
-        # Gerar a nuvem de palavras
-        wordcloud = WordCloud(width=600, height=300, background_color='white').generate(' '.join(tokens_list))
-        img = io.BytesIO()
-        wordcloud.to_image().save(img, format='JPEG')
-        img.seek(0)
+        # Gerar a nuvem de palavras a partir das frequências do corpus
+        src = salvar_nuvem(corpus.mais_frequentes(TERMOS_NUVEM))
         
         # Exibir as 2 primeiras linhas do DataFrame em uma tabela HTML dentro de um quadro
+        previa = com_tokens(data.iloc[:2], 0, corpus)
         table_output = html.Div([
             html.H3('2 primeiras linhas do arquivo de saída:'),
             dash_table.DataTable(
-                columns=[{"name": i, "id": i} for i in data.columns],
-                data=data.to_dict('records')[:2],
+                columns=[{"name": i, "id": i} for i in previa.columns],
+                data=previa.to_dict('records'),
                 style_table={'width': '100%', 'maxWidth': '1500px', 'margin': 'auto'},  
                 style_cell={'textOverflow': 'ellipsis', 'textAlign': 'left', 'color': 'black'},
                 style_data={'whiteSpace': 'normal', 'height': 'auto'}
@@ -147,7 +239,7 @@ def update_output(contents, filename):
         ])
         
         # Retornar a exibição do DataFrame e a nuvem de palavras
-        return table_output, 'data:image/jpeg;base64,' + base64.b64encode(img.getvalue()).decode()
+        return table_output, src
     else:
         return None, None
 
@@ -162,23 +254,22 @@ def show_upload_output(contents):
     else:
         return {'display': 'none'}
     
-# Callback para fazer download do arquivo CSV modificado
+# Links de download do arquivo CSV modificado (rota /download_csv da sessão)
 @app.callback(
-    Output("download_csv", "data"),
-    [Input("btn_csv", "n_clicks")]
+    [Output('link-csv', 'href'), Output('link-csv-gz', 'href')],
+    [Input('session-id', 'data')]
 )
-def download_csv(n_clicks):
-    global data  
-    if n_clicks is not None and data is not None:
-        # Crie um buffer de memória para armazenar o CSV
-        buffer = io.StringIO()
-        # Salve o DataFrame no buffer como um arquivo CSV
-        data.to_csv(buffer, index=False, encoding="utf-8", sep=";")
-        # Volte para o início do buffer
-        buffer.seek(0)
-        # Retorne o arquivo CSV como uma resposta para download
-        csv_data = buffer.getvalue()
-        return dict(content=csv_data, filename="tabela.csv")
+def links_download(session_id):
+    return f'/download_csv?sessao={session_id}', f'/download_csv?sessao={session_id}&gzip=1'
+
+# Rota para baixar o arquivo CSV: a tabela é convertida e enviada em blocos (opcionalmente comprimida com ?gzip=1)
+@server.route("/download_csv")
+def download_csv_route():
+    sessao = flask.request.args.get('sessao')
+    data, corpus = armazem.obter(sessao, 'data'), armazem.obter(sessao, 'corpus')
+    if data is None or corpus is None:
+        flask.abort(404)
+    return resposta_download(blocos_csv(data, corpus=corpus), 'tabela.csv', 'text/csv; charset=utf-8', pediu_gzip())
 
 # MOSTRAR A NUVEM GERAL APENAS SE O CSV É INSERIDO
 @app.callback(Output('wordcloud-image', 'style'),
@@ -192,19 +283,15 @@ def update_image_style(contents):
 # Callback para atualizar a nuvem de palavras por uma lista
 @app.callback(Output('wordcloud-image-lista', 'children'), 
               [Input('btn-atualizar-nuvem-lista', 'n_clicks')],
-              [State('input-lista', 'value')])
-def update_wordcloud_by_list(n_clicks, lista):
-    global tokens_list
-
-    if tokens_list  and n_clicks > 0 and lista:
-        filtered_text = []
-        for tokens_string in tokens_list:
-            tokens = tokens_string.split()
-            filtered_text.append([token for token in tokens if token in lista])
-        flat_filtered_tokens = [token for sublist in filtered_text for token in sublist]
-
-        # Contagem das palavras no texto filtrado
-        word_counts = Counter(flat_filtered_tokens)
+              [State('input-lista', 'value'), State('session-id', 'data')])
+def update_wordcloud_by_list(n_clicks, lista, session_id):
+    corpus = armazem.obter(session_id, 'corpus')
+
+    if corpus and n_clicks > 0 and lista:
+        # Contagem das palavras da lista direto das frequências do corpus
+        word_counts = corpus.filtrar(lista.split())
+        if not word_counts:
+            return html.Div([html.H3('Nenhuma palavra da lista aparece nos tokens.')])
         top_10_words = word_counts.most_common(10)
         top_words_list = [html.Li(f"{word}: {count} vezes", style={'color': 'white'}) for word, count in top_10_words]
         
@@ -213,12 +300,7 @@ def update_wordcloud_by_list(n_clicks, lista):
                                      html.Ul(top_words_list)  ])
 
         # Criar a nuvem de palavras com base no texto filtrado
-        filtered_text = ' '.join(flat_filtered_tokens)
-        wordcloud = WordCloud(width=600, height=300, background_color='white').generate(filtered_text)
-        img = io.BytesIO()
-        wordcloud.to_image().save(img, format='JPEG')
-        img.seek(0)
-        wordcloud_image = html.Img(src='data:image/jpeg;base64,' + base64.b64encode(img.getvalue()).decode(), style={'width': '100%', 'margin': 'auto', 'display': 'block'})
+        wordcloud_image = html.Img(src=salvar_nuvem(word_counts), style={'width': '100%', 'margin': 'auto', 'display': 'block'})
         
         return [wordcloud_image,table_frequencia ]
     else:
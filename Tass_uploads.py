@@ -0,0 +1,94 @@
+import os
+import re
+import time
+import uuid
+import hashlib
+import tempfile
+
+# Pasta onde os uploads são gravados e limites aceitos (ajustáveis pelas variáveis de ambiente do servidor)
+PASTA_UPLOADS = os.environ.get('TASS_PASTA_UPLOADS', os.path.join(tempfile.gettempdir(), 'tass_uploads'))
+LIMITE_MB_UPLOAD = int(os.environ.get('TASS_UPLOAD_MB', 1024))
+TTL_UPLOADS = int(os.environ.get('TASS_SESSOES_TTL', 3600))
+TAMANHO_BLOCO = 1024 * 1024
+
+# O identificador devolvido ao navegador é só um uuid, nunca um caminho
+padrao_identificador = re.compile(r'^[0-9a-f]{32}$')
+
+class UploadInvalido(Exception):
+    pass
+
+def caminho_upload(identificador):
+    if not identificador or not padrao_identificador.match(identificador):
+        raise UploadInvalido('Identificador de arquivo inválido.')
+    caminho = os.path.join(PASTA_UPLOADS, identificador)
+    if not os.path.exists(caminho):
+        raise UploadInvalido('O arquivo enviado expirou. Envie o arquivo novamente.')
+    return caminho
+
+# Grava o corpo da requisição em disco bloco a bloco, sem manter o arquivo inteiro em memória.
+# O hash do conteúdo é calculado durante a gravação e guardado ao lado do arquivo (identificador.sha256):
+# ele identifica os resultados já calculados para o mesmo conteúdo.
+def salvar_stream(stream, limite_bytes=LIMITE_MB_UPLOAD * 1024 * 1024):
+    os.makedirs(PASTA_UPLOADS, exist_ok=True)
+    remover_expirados()
+    identificador = uuid.uuid4().hex
+    caminho = os.path.join(PASTA_UPLOADS, identificador)
+    total = 0
+    conteudo = hashlib.sha256()
+    try:
+        with open(caminho, 'wb') as destino:
+            while True:
+                bloco = stream.read(TAMANHO_BLOCO)
+                if not bloco:
+                    break
+                total += len(bloco)
+                if total > limite_bytes:
+                    raise UploadInvalido(f'O arquivo ultrapassa o limite de {limite_bytes // (1024 * 1024)} MB.')
+                destino.write(bloco)
+                conteudo.update(bloco)
+        with open(caminho + '.sha256', 'w') as arquivo_hash:
+            arquivo_hash.write(conteudo.hexdigest())
+    except Exception:
+        os.remove(caminho)
+        raise
+    return identificador, total
+
+def hash_upload(identificador):
+    caminho = caminho_upload(identificador)
+    try:
+        with open(caminho + '.sha256') as arquivo_hash:
+            return arquivo_hash.read().strip()
+    except OSError:
+        # Arquivo gravado antes do hash existir: calcular agora
+        conteudo = hashlib.sha256()
+        with open(caminho, 'rb') as arquivo:
+            for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO), b''):
+                conteudo.update(bloco)
+        return conteudo.hexdigest()
+
+# Gerador de linhas do arquivo enviado: o conteúdo é lido aos poucos, nunca inteiro
+def ler_linhas(identificador):
+    with open(caminho_upload(identificador), encoding='utf-8') as arquivo:
+        for linha in arquivo:
+            yield linha
+
+# Como ler_linhas, mas com quantos bytes do arquivo já foram lidos junto de cada linha (progresso dos jobs)
+def ler_linhas_posicao(identificador):
+    with open(caminho_upload(identificador), encoding='utf-8') as arquivo:
+        posicao = arquivo.buffer.tell
+        for linha in arquivo:
+            yield linha, posicao()
+
+def ler_inicio(identificador, caracteres=1000):
+    with open(caminho_upload(identificador), encoding='utf-8') as arquivo:
+        return arquivo.read(caracteres)
+
+def remover_expirados():
+    limite = time.time() - TTL_UPLOADS
+    for nome in os.listdir(PASTA_UPLOADS):
+        caminho = os.path.join(PASTA_UPLOADS, nome)
+        try:
+            if os.path.getmtime(caminho) < limite:
+                os.remove(caminho)
+        except OSError:
+            pass  # arquivo removido por outro worker
@@ -0,0 +1,58 @@
+// Envio do arquivo TXT direto para a rota /upload do servidor.
+// O conteúdo não passa pelo callback do Dash em base64: o callback recebe apenas o identificador
+// devolvido pelo servidor, escrito no campo oculto 'upload-handle'.
+(function () {
+    function definirIdentificador(valor) {
+        var campo = document.getElementById('upload-handle');
+        var setter = Object.getOwnPropertyDescriptor(window.HTMLInputElement.prototype, 'value').set;
+        setter.call(campo, valor);
+        campo.dispatchEvent(new Event('input', {bubbles: true}));
+    }
+
+    function enviarArquivo(arquivo) {
+        fetch('/upload', {method: 'POST', body: arquivo, headers: {'Content-Type': 'application/octet-stream'}})
+            .then(function (resposta) { return resposta.json(); })
+            .then(function (resposta) {
+                if (resposta.erro) {
+                    alert(resposta.erro);
+                } else {
+                    definirIdentificador(resposta.arquivo);
+                }
+            })
+            .catch(function (erro) { alert('Falha no envio do arquivo: ' + erro); });
+    }
+
+    // O Dash carrega a pasta assets/ em todos os aplicativos desta pasta: só a página com o campo
+    // 'upload-handle' (Tass_textanalyzer.py) tem a rota /upload. Nos outros, o dcc.Upload segue normal.
+    function dentroDoUpload(elemento) {
+        return document.getElementById('upload-handle') && elemento && elemento.closest && elemento.closest('#upload-data');
+    }
+
+    document.addEventListener('click', function (evento) {
+        if (dentroDoUpload(evento.target)) {
+            evento.preventDefault();
+            var seletor = document.createElement('input');
+            seletor.type = 'file';
+            seletor.accept = '.txt';
+            seletor.addEventListener('change', function () {
+                if (seletor.files.length) {
+                    enviarArquivo(seletor.files[0]);
+                }
+            });
+            seletor.click();
+        }
+    });
+    document.addEventListener('dragover', function (evento) {
+        if (dentroDoUpload(evento.target)) {
+            evento.preventDefault();
+        }
+    });
+    document.addEventListener('drop', function (evento) {
+        if (dentroDoUpload(evento.target)) {
+            evento.preventDefault();
+            if (evento.dataTransfer.files.length) {
+                enviarArquivo(evento.dataTransfer.files[0]);
+            }
+        }
+    });
+})();
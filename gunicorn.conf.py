@@ -0,0 +1,16 @@
+import gc
+import os
+
+# Configuração do gunicorn (Procfile). Com preload_app o aplicativo é importado uma vez no processo mestre,
+# antes da criação dos workers: o modelo SpaCy é carregado e aquecido ali e os workers o recebem já pronto,
+# compartilhando as páginas de memória do mestre (copy-on-write) em vez de cada um carregar a sua cópia.
+preload_app = True
+os.environ.setdefault('TASS_CARREGAR_MODELO', 'importacao')
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+timeout = int(os.environ.get('TASS_TIMEOUT', 120))
+
+# Depois da carga, os objetos do mestre saem da coleta de lixo: sem isso a primeira coleta em cada worker
+# tocaria todos esses objetos e copiaria as páginas compartilhadas
+def when_ready(server):
+    gc.freeze()
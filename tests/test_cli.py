@@ -0,0 +1,32 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from Tass_cli import main, ARQUIVO_PROGRESSO
+
+# Teste rápido do modo de linha de comando: processa, grava o progresso e, numa segunda execução, pula o que já foi feito
+@pytest.mark.parametrize('opcoes', [['--modo', 'clean_text_2'], ['--modo', 'clean_text_2', '--limite-termos', '2'],
+                                    ['--modo', 'clean_text']])
+def test_processa_e_retoma(tmp_path, capsys, opcoes):
+    entrada = tmp_path / 'entrada'
+    entrada.mkdir()
+    (entrada / 'a.txt').write_text('o gato dorme\no gato come\n\nO cachorro late!\n', encoding='utf-8')
+    (entrada / 'b.txt').write_text('texto curto\ntexto curto\n', encoding='utf-8')
+    saida = tmp_path / 'saida'
+    argumentos = [str(entrada / '*.txt'), '--saida', str(saida), '--processos', '1'] + opcoes
+
+    assert main(argumentos) == 0
+    progresso = json.loads((saida / ARQUIVO_PROGRESSO).read_text(encoding='utf-8'))
+    assert len(progresso) == 2
+    for resultado in progresso.values():
+        assert isinstance(resultado['tokens'], int) and resultado['tokens'] > 0
+    assert not (saida / (ARQUIVO_PROGRESSO + '.tmp')).exists()
+    assert (saida / 'a.tokens.txt').read_text(encoding='utf-8').count('\n') == 3
+    assert (saida / 'b.frequencias.csv').exists()
+    capsys.readouterr()
+
+    assert main(argumentos) == 0
+    assert '2 arquivos, 2 já processados' in capsys.readouterr().err
@@ -0,0 +1,42 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Tass_corpus import CorpusCodificado
+from Tass_corpus_disco import GravadorCorpus, GravadorAproximado, CorpusAproximado
+
+LINHAS = ['gato preto dorme', 'gato preto come', '#a #b #c', 'cachorro late', 'gato preto dorme']
+
+def gravar(gravador, linhas):
+    for linha in linhas:
+        gravador.append(linha)
+    return gravador.fechar()
+
+def test_gravador_igual_ao_corpus_em_memoria(tmp_path):
+    corpus = gravar(GravadorCorpus(str(tmp_path)), LINHAS)
+    memoria = CorpusCodificado.de_linhas(LINHAS)
+    assert list(corpus) == list(memoria)
+    assert corpus.frequencias() == memoria.frequencias()
+
+# Com limite grande o bastante para não compactar, o corpus aproximado dá o mesmo resultado que o exato
+def test_corpus_aproximado(tmp_path):
+    exato = CorpusCodificado.de_linhas(LINHAS)
+    corpus = gravar(GravadorAproximado(100, str(tmp_path)), LINHAS)
+    assert CorpusAproximado(corpus.pasta).total_tokens == exato.total_tokens
+    assert len(corpus) == len(exato) and list(corpus) == list(exato) and corpus[:2] == exato[:2]
+    assert corpus.erro_maximo == 0
+    assert corpus.mais_frequentes(3) == exato.mais_frequentes(3)
+    assert dict(corpus.filtrar(['gato', 'late', 'nada']).items()) == exato.filtrar(['gato', 'late', 'nada'])
+    assert corpus.ngramas_frequentes(2) == exato.ngramas_frequentes(2)
+    assert corpus.colocacoes(5, minimo=2)[0] == exato.colocacoes(5, minimo=2)[0]
+
+# Com limite pequeno só os termos mais comuns ficam guardados, com o erro dentro do limite
+def test_corpus_aproximado_limitado(tmp_path):
+    linhas = LINHAS + [f'#raro{i} gato' for i in range(100)]
+    corpus = gravar(GravadorAproximado(2, str(tmp_path)), linhas)
+    real = CorpusCodificado.de_linhas(linhas).frequencias()
+    assert 0 < corpus.erro_maximo <= corpus.total_tokens / 3
+    assert len(corpus.frequencias) <= 4
+    minimo, maximo = corpus.frequencias.intervalo('gato')
+    assert minimo <= real['gato'] <= maximo
@@ -0,0 +1,55 @@
+import os
+import sys
+import random
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from Tass_frequencias import contar_frequencias, ContagemAproximada
+
+# Texto de cauda longa: poucos termos muito frequentes e muitos que aparecem uma ou duas vezes
+def linhas_cauda_longa(semente, linhas=2000):
+    aleatorio = random.Random(semente)
+    frequentes = [f'termo{i}' for i in range(20)]
+    resultado = []
+    for _ in range(linhas):
+        termos = [aleatorio.choice(frequentes) for _ in range(aleatorio.randint(1, 6))]
+        termos += [f'#raro{aleatorio.randint(0, 10 ** 6)}' for _ in range(aleatorio.randint(0, 4))]
+        aleatorio.shuffle(termos)
+        resultado.append(' '.join(termos))
+    return resultado
+
+# Invariantes do Misra-Gries: contagem <= real <= contagem + erro_maximo, erro_maximo <= total / (limite + 1)
+# e todo termo com frequência real acima de erro_maximo continua no índice
+@pytest.mark.parametrize('semente', range(5))
+@pytest.mark.parametrize('limite', [1, 5, 50, 500])
+def test_invariantes_misra_gries(semente, limite):
+    linhas = linhas_cauda_longa(semente)
+    real = contar_frequencias(linhas)
+    aproximada = contar_frequencias(linhas, limite)
+
+    assert aproximada.total == sum(real.values())
+    assert aproximada.erro_maximo <= aproximada.total / (limite + 1)
+    assert len(aproximada) <= 2 * limite
+    for termo, frequencia in real.items():
+        minimo, maximo = aproximada.intervalo(termo)
+        assert minimo == aproximada[termo]
+        assert minimo <= frequencia <= maximo
+        if frequencia > aproximada.erro_maximo:
+            assert termo in aproximada
+
+def test_sem_compactacao_e_exata():
+    linhas = ['a b c', 'a b', 'a']
+    aproximada = contar_frequencias(linhas, 10)
+    assert aproximada.erro_maximo == 0
+    assert dict(aproximada.items()) == dict(Counter('a b c a b a'.split()))
+
+def test_filtrar_mantem_o_erro():
+    aproximada = contar_frequencias(linhas_cauda_longa(0), 5)
+    filtrada = aproximada.filtrar(['termo1', 'termo2', 'inexistente'])
+    assert isinstance(filtrada, ContagemAproximada)
+    assert set(dict(filtrada.items())) <= {'termo1', 'termo2'}
+    assert filtrada.erro_maximo == aproximada.erro_maximo
+    for termo, contagem in filtrada.items():
+        assert filtrada.intervalo(termo) == aproximada.intervalo(termo)